@@ -0,0 +1,223 @@
+"""Synthetic Meross fleet used by the benchmarks: HTTP API stand-in and in-process command/push simulation"""
+import asyncio
+import base64
+import json
+import random
+import time
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from aiohttp import web
+from meross_iot.manager import MerossManager
+from meross_iot.model.enums import Namespace
+from meross_iot.model.push.generic import GenericPushNotification
+
+from custom_components.meross_cloud.scheduler import CommandSchedulerMixin
+
+SIMULATED_TYPES = ("mss310", "msh300", "msg200", "mrs100", "mod100")
+
+_COMMON_ABILITIES = (Namespace.SYSTEM_ALL, Namespace.SYSTEM_ONLINE, Namespace.SYSTEM_ABILITY)
+_ABILITIES = {
+    "mss310": _COMMON_ABILITIES + (Namespace.CONTROL_TOGGLEX, Namespace.CONTROL_ELECTRICITY,
+                                   Namespace.CONTROL_CONSUMPTIONX),
+    "msh300": _COMMON_ABILITIES + (Namespace.HUB_ONLINE, Namespace.HUB_TOGGLEX, Namespace.HUB_BATTERY,
+                                   Namespace.HUB_SENSOR_ALL, Namespace.HUB_SENSOR_TEMPHUM,
+                                   Namespace.HUB_MTS100_ALL, Namespace.HUB_MTS100_MODE,
+                                   Namespace.HUB_MTS100_TEMPERATURE),
+    "msg200": _COMMON_ABILITIES + (Namespace.GARAGE_DOOR_STATE,),
+    "mrs100": _COMMON_ABILITIES + (Namespace.ROLLER_SHUTTER_STATE, Namespace.ROLLER_SHUTTER_POSITION,
+                                   Namespace.ROLLER_SHUTTER_CONFIG),
+    "mod100": _COMMON_ABILITIES + (Namespace.DIFFUSER_LIGHT, Namespace.DIFFUSER_SPRAY),
+}
+_CHANNELS = {
+    "msg200": [{}, {"devName": "Door 1"}, {"devName": "Door 2"}, {"devName": "Door 3"}],
+}
+
+
+class SimulatedDevice:
+    def __init__(self, device_type: str, index: int, subdevices_per_hub: int):
+        self.device_type = device_type
+        self.uuid = "%s%026d" % (device_type, index)
+        self.name = f"{device_type.upper()} #{index}"
+        self.channels = _CHANNELS.get(device_type, [{}])
+        self.subdevices: List[Tuple[str, str]] = []
+        if device_type == "msh300":
+            for i in range(subdevices_per_hub):
+                self.subdevices.append((f"{index:04d}ms{i:04d}", "ms100"))
+                self.subdevices.append((f"{index:04d}vl{i:04d}", "mts100v3"))
+
+    def http_info(self, api_domain: str) -> dict:
+        return {
+            "uuid": self.uuid,
+            "onlineStatus": 1,
+            "devName": self.name,
+            "deviceType": self.device_type,
+            "channels": self.channels,
+            "fmwareVersion": "6.1.8",
+            "hdwareVersion": "6.0.0",
+            "domain": api_domain,
+            "reservedDomain": api_domain,
+        }
+
+    def http_subdevices(self) -> List[dict]:
+        return [{"subDeviceId": sid, "trueId": sid, "subDeviceType": stype, "subDeviceVendor": "meross",
+                 "subDeviceName": f"{stype} {sid}", "subDeviceIconId": None} for sid, stype in self.subdevices]
+
+    def _subdevices_of(self, subdevice_type: str) -> List[str]:
+        return [sid for sid, stype in self.subdevices if stype == subdevice_type]
+
+    def system_all(self) -> dict:
+        digest = {}
+        if self.device_type == "mss310":
+            digest["togglex"] = [{"channel": 0, "onoff": 1, "lmTime": 0}]
+        elif self.device_type == "msg200":
+            digest["garageDoor"] = [{"channel": i, "open": 0, "lmTime": 0} for i in range(1, len(self.channels))]
+        elif self.device_type == "mod100":
+            digest["diffuser"] = {"light": [{"channel": 0, "onoff": 1, "mode": 0, "luminance": 50, "rgb": 255}],
+                                  "spray": [{"channel": 0, "mode": 0}]}
+        elif self.device_type == "msh300":
+            digest["hub"] = {"hubId": 1, "mode": 0, "subdevice": [{"id": sid, "status": 1}
+                                                                   for sid, _ in self.subdevices]}
+        return {"all": {"system": {"online": {"status": 1},
+                                   "firmware": {"innerIp": "10.0.0.1"},
+                                   "hardware": {"macAddress": "00:00:00:00:00:00"}},
+                        "digest": digest}}
+
+    def handle_command(self, method: str, namespace: Namespace, payload: dict) -> dict:
+        if method != "GET":
+            return {}
+        if namespace == Namespace.SYSTEM_ABILITY:
+            return {"ability": {n.value: {} for n in _ABILITIES[self.device_type]}}
+        if namespace == Namespace.SYSTEM_ALL:
+            return self.system_all()
+        if namespace == Namespace.CONTROL_ELECTRICITY:
+            return {"electricity": {"channel": payload.get("electricity", {}).get("channel", 0),
+                                    "current": random.randint(100, 1000), "voltage": 2300,
+                                    "power": random.randint(1000, 100000)}}
+        if namespace == Namespace.CONTROL_CONSUMPTIONX:
+            today = date.today()
+            return {"consumptionx": [{"date": (today - timedelta(days=d)).strftime("%Y-%m-%d"),
+                                      "time": int(time.time()), "value": random.randint(0, 5000)}
+                                     for d in range(30)]}
+        if namespace == Namespace.ROLLER_SHUTTER_CONFIG:
+            return {"config": [{"channel": 0, "signalOpen": 30000, "signalClose": 30000}]}
+        if namespace == Namespace.ROLLER_SHUTTER_POSITION:
+            return {"position": [{"channel": 0, "position": 50}]}
+        if namespace == Namespace.HUB_SENSOR_ALL:
+            return {"all": [{"id": sid, "online": {"status": 1},
+                             "temperature": {"latest": 215, "min": -200, "max": 600},
+                             "humidity": {"latest": 550}} for sid in self._subdevices_of("ms100")]}
+        if namespace == Namespace.HUB_MTS100_ALL:
+            return {"all": [{"id": sid, "online": {"status": 1}, "togglex": {"onoff": 1}, "mode": {"state": 0},
+                             "temperature": {"room": 205, "currentSet": 210, "min": 50, "max": 350,
+                                             "heating": 0, "openWindow": 0}}
+                            for sid in self._subdevices_of("mts100v3")]}
+        if namespace == Namespace.HUB_MTS100_TEMPERATURE:
+            return {"temperature": [{"id": sid, "room": 205, "currentSet": 210}
+                                    for sid in self._subdevices_of("mts100v3")]}
+        if namespace == Namespace.HUB_BATTERY:
+            return {"battery": [{"id": sid, "value": 90} for sid, _ in self.subdevices]}
+        return {}
+
+    def random_push(self) -> GenericPushNotification:
+        """Returns a push notification the device could plausibly emit"""
+        if self.device_type == "mss310":
+            namespace, data = Namespace.CONTROL_TOGGLEX, {"togglex": {"channel": 0, "onoff": random.randint(0, 1)}}
+        elif self.device_type == "msg200":
+            channel = random.randint(1, len(self.channels) - 1)
+            namespace, data = Namespace.GARAGE_DOOR_STATE, {"state": [{"channel": channel,
+                                                                       "open": random.randint(0, 1)}]}
+        elif self.device_type == "mrs100":
+            namespace, data = Namespace.ROLLER_SHUTTER_POSITION, {"position": [{"channel": 0,
+                                                                                "position": random.randint(0, 100)}]}
+        elif self.device_type == "mod100":
+            namespace, data = Namespace.DIFFUSER_SPRAY, {"spray": [{"channel": 0, "mode": random.randint(0, 2)}]}
+        else:
+            namespace, data = Namespace.HUB_TOGGLEX, {"togglex": [{"id": sid, "channel": 0,
+                                                                   "onoff": random.randint(0, 1)}
+                                                                  for sid in self._subdevices_of("mts100v3")[:1]]}
+        return GenericPushNotification(namespace=namespace, originating_device_uuid=self.uuid, raw_data=data)
+
+
+class SimulatedFleet:
+    """A set of synthetic devices, ``count`` for every simulated type"""
+
+    def __init__(self, count: int, subdevices_per_hub: int = 2, command_latency: float = 0.0):
+        self.devices: Dict[str, SimulatedDevice] = {}
+        self.command_latency = command_latency
+        self.commands_served = 0
+        for device_type in SIMULATED_TYPES:
+            for i in range(count):
+                device = SimulatedDevice(device_type=device_type, index=i, subdevices_per_hub=subdevices_per_hub)
+                self.devices[device.uuid] = device
+
+    def random_push(self) -> GenericPushNotification:
+        return random.choice(list(self.devices.values())).random_push()
+
+
+class SimulatedHttpApi:
+    """Local stand-in for the Meross HTTP API, serving the device and hub subdevice lists of the fleet"""
+
+    def __init__(self, fleet: SimulatedFleet, host: str = "127.0.0.1", port: int = 0):
+        self._fleet = fleet
+        self._host = host
+        self._port = port
+        self._runner: Optional[web.AppRunner] = None
+        self.url: Optional[str] = None
+        self.requests_served = 0
+
+    async def async_start(self) -> None:
+        app = web.Application()
+        app.router.add_post("/v1/Device/devList", self._handle_dev_list)
+        app.router.add_post("/v1/Hub/getSubDevices", self._handle_subdevices)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self._host, self._port)
+        await site.start()
+        port = self._runner.addresses[0][1]
+        self.url = f"http://{self._host}:{port}"
+
+    async def async_stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    async def _handle_dev_list(self, request: web.Request) -> web.Response:
+        self.requests_served += 1
+        data = [d.http_info(api_domain=self.url) for d in self._fleet.devices.values()]
+        return web.json_response({"apiStatus": 0, "data": data})
+
+    async def _handle_subdevices(self, request: web.Request) -> web.Response:
+        self.requests_served += 1
+        body = await request.json()
+        params = _decode_params(body.get("params", ""))
+        device = self._fleet.devices.get(params.get("uuid"))
+        data = device.http_subdevices() if device is not None else []
+        return web.json_response({"apiStatus": 0, "data": data})
+
+
+def _decode_params(encoded: str) -> dict:
+    return json.loads(base64.b64decode(encoded).decode("utf8")) if encoded else {}
+
+
+class _SimulatedTransportManager(MerossManager):
+    """Manager answering commands from the simulated fleet, in place of the MQTT broker and the devices"""
+    fleet: SimulatedFleet = None
+
+    async def async_execute_cmd(self, mqtt_hostname: str, mqtt_port: int, destination_device_uuid: str,
+                                method: str, namespace, payload: dict, *args, **kwargs):
+        fleet = self.fleet
+        fleet.commands_served += 1
+        if fleet.command_latency > 0:
+            await asyncio.sleep(fleet.command_latency)
+        return fleet.devices[destination_device_uuid].handle_command(method=method, namespace=Namespace(namespace),
+                                                                     payload=payload)
+
+
+class SimulatedManager(CommandSchedulerMixin, _SimulatedTransportManager):
+    """
+    Simulated manager scheduling its commands the same way the integration manager does.
+    Pushes are injected with :meth:`async_inject_push`.
+    """
+
+    async def async_inject_push(self, push_notification: GenericPushNotification) -> None:
+        await self._handle_and_dispatch_push_notification(push_notification)
@@ -0,0 +1,194 @@
+"""
+Benchmarks the integration hot paths against a simulated Meross fleet.
+
+Usage (from the repository root, within an environment where homeassistant and meross_iot are installed):
+
+    python -m benchmarks.run --devices 20 --events 500
+"""
+import argparse
+import asyncio
+import importlib
+import logging
+import statistics
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List
+
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.entity import Entity
+from meross_iot.model.credentials import MerossCloudCreds
+
+import custom_components.meross_cloud as integration
+from custom_components.meross_cloud.common import (DOMAIN, MANAGER, DEVICE_LIST_COORDINATOR, MEROSS_PLATFORMS,
+                                                   ELECTRICITY_SAMPLERS, CONSUMPTION_CACHES, HUB_POLLERS, PUSH_ROUTERS,
+                                                   DND_MODE_COORDINATORS, LOADED_PLATFORMS, METRICS, DEVICE_REFRESHERS,
+                                                   BATTERY_STORE, POLL_PHASES, ERRORS, HTTP_UPDATE_INTERVAL,
+                                                   DEFAULT_USER_AGENT, ErrorRecorder)
+from custom_components.meross_cloud.battery import BatteryStore
+from custom_components.meross_cloud.coordinator import PollPhaseAllocator
+from custom_components.meross_cloud.metrics import IntegrationMetrics
+from .fleet import SimulatedFleet, SimulatedHttpApi, SimulatedManager
+
+_LOGGER = logging.getLogger("benchmarks")
+
+
+class BenchmarkConfigEntry:
+    """Minimal config entry exposing what the integration uses at setup time"""
+
+    def __init__(self, hass: HomeAssistant):
+        self._hass = hass
+        self.entry_id = "benchmark"
+        self.options = {}
+        self.data = {}
+        self._on_unload: List[Callable] = []
+
+    def async_on_unload(self, func: Callable) -> None:
+        self._on_unload.append(func)
+
+    def async_create_background_task(self, hass: HomeAssistant, target, name: str) -> asyncio.Task:
+        return hass.async_create_background_task(target, name)
+
+    def async_unload(self) -> None:
+        for func in self._on_unload:
+            func()
+
+
+class EntityCollector:
+    """Adds the entities the way HA does, without the entity registry, and keeps track of them"""
+
+    def __init__(self, hass: HomeAssistant, domain: str):
+        self._hass = hass
+        self._domain = domain
+        self.entities: List[Entity] = []
+
+    def __call__(self, new_entities, update_before_add: bool = False) -> None:
+        self._hass.async_create_task(self._async_add(list(new_entities), update_before_add))
+
+    async def _async_add(self, new_entities: List[Entity], update_before_add: bool) -> None:
+        for entity in new_entities:
+            entity.hass = self._hass
+            entity.entity_id = f"{self._domain}.bench_{len(self.entities)}"
+            self.entities.append(entity)
+        if update_before_add:
+            await asyncio.gather(*(e.async_update() for e in new_entities))
+        for entity in new_entities:
+            await entity.async_added_to_hass()
+            entity.async_write_ha_state()
+
+
+async def async_setup_integration(hass: HomeAssistant, api: SimulatedHttpApi) -> Dict[str, EntityCollector]:
+    """Sets up the coordinator and the platforms the same way async_setup_entry does, then runs the discovery"""
+    entry = BenchmarkConfigEntry(hass)
+    creds = MerossCloudCreds(token="token", key="key", user_id="0", user_email="bench@localhost",
+                             issued_on=datetime.now(), domain=api.url, mqtt_domain="127.0.0.1")
+    hass.data[DOMAIN] = {"ADDED_ENTITIES_IDS": set(), ELECTRICITY_SAMPLERS: {}, CONSUMPTION_CACHES: {},
+                       HUB_POLLERS: {}, DND_MODE_COORDINATORS: {}, PUSH_ROUTERS: {},
+                       LOADED_PLATFORMS: set(MEROSS_PLATFORMS), METRICS: IntegrationMetrics(), DEVICE_REFRESHERS: {},
+                       POLL_PHASES: PollPhaseAllocator(), ERRORS: ErrorRecorder(),
+                       BATTERY_STORE: BatteryStore(hass=hass, entry_id=entry.entry_id)}
+
+    coordinator = integration.MerossCoordinator(hass=hass, config_entry=entry, http_api_endpoint=api.url, creds=creds,
+                                                mqtt_skip_cert_validation=True, mqtt_override_address=None,
+                                                update_interval=timedelta(seconds=HTTP_UPDATE_INTERVAL),
+                                                ua_header=DEFAULT_USER_AGENT)
+    await coordinator.initial_setup()
+    hass.data[DOMAIN][MANAGER] = coordinator.manager
+    hass.data[DOMAIN][DEVICE_LIST_COORDINATOR] = coordinator
+
+    collectors = {}
+    for platform in MEROSS_PLATFORMS:
+        module = importlib.import_module(f"custom_components.meross_cloud.{platform}")
+        collectors[platform] = EntityCollector(hass, platform)
+        await module.async_setup_entry(hass, entry, collectors[platform])
+
+    await coordinator.async_initial_discovery()
+    await hass.async_block_till_done()
+    return collectors
+
+
+async def async_measure_push_latency(hass: HomeAssistant, fleet: SimulatedFleet, events: int) -> List[float]:
+    manager: SimulatedManager = hass.data[DOMAIN][MANAGER]
+    latencies = []
+    for _ in range(events):
+        push = fleet.random_push()
+        start = time.perf_counter()
+        await manager.async_inject_push(push)
+        await hass.async_block_till_done()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+async def async_measure_push_storm(hass: HomeAssistant, fleet: SimulatedFleet, events: int) -> float:
+    manager: SimulatedManager = hass.data[DOMAIN][MANAGER]
+    pushes = [fleet.random_push() for _ in range(events)]
+    start = time.perf_counter()
+    await asyncio.gather(*(manager.async_inject_push(p) for p in pushes))
+    await hass.async_block_till_done()
+    return time.perf_counter() - start
+
+
+def _percentile(values: List[float], percentile: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percentile))]
+
+
+async def async_main(args: argparse.Namespace) -> None:
+    fleet = SimulatedFleet(count=args.devices, subdevices_per_hub=args.subdevices,
+                           command_latency=args.command_latency / 1000)
+    SimulatedManager.fleet = fleet
+    integration.SchedulingMerossManager = SimulatedManager
+
+    api = SimulatedHttpApi(fleet)
+    await api.async_start()
+
+    with tempfile.TemporaryDirectory() as config_dir:
+        hass = HomeAssistant(config_dir)
+        try:
+            tracemalloc.start()
+            start = time.perf_counter()
+            collectors = await async_setup_integration(hass, api)
+            setup_time = time.perf_counter() - start
+            memory, peak_memory = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            commands_after_setup = fleet.commands_served
+            latencies = await async_measure_push_latency(hass, fleet, args.events)
+            storm_time = await async_measure_push_storm(hass, fleet, args.events)
+
+            entities = sum(len(c.entities) for c in collectors.values())
+            print(f"Simulated devices:        {len(fleet.devices)} ({args.devices} per type)")
+            print(f"Entities:                 {entities}")
+            print(f"Setup + discovery:        {setup_time * 1000:.1f} ms")
+            print(f"HTTP API requests:        {api.requests_served}")
+            print(f"Device commands (setup):  {commands_after_setup}")
+            print(f"Push latency p50/p95/max: {statistics.median(latencies) * 1000:.2f} / "
+                  f"{_percentile(latencies, 0.95) * 1000:.2f} / {max(latencies) * 1000:.2f} ms")
+            print(f"Push storm:               {args.events} events in {storm_time * 1000:.1f} ms "
+                  f"({args.events / storm_time:.0f} events/s)")
+            print(f"Device commands (pushes): {fleet.commands_served - commands_after_setup}")
+            print(f"Memory after setup:       {memory / 1024 / 1024:.2f} MiB (peak {peak_memory / 1024 / 1024:.2f} MiB)")
+        finally:
+            hass.data[DOMAIN][MANAGER].close()
+            await hass.async_stop(force=True)
+            await api.async_stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmarks the Meross integration against a simulated fleet")
+    parser.add_argument("--devices", type=int, default=10, help="Number of simulated devices of every type")
+    parser.add_argument("--subdevices", type=int, default=2,
+                        help="Number of MS100 sensors and MTS100 valves attached to every hub")
+    parser.add_argument("--events", type=int, default=200, help="Number of push notifications to inject")
+    parser.add_argument("--command-latency", type=float, default=0,
+                        help="Simulated round-trip time of device commands, in milliseconds")
+    parser.add_argument("--verbose", action="store_true", help="Print the integration logs")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.ERROR)
+    asyncio.run(async_main(args))
+
+
+if __name__ == "__main__":
+    main()
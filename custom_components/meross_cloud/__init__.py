@@ -1,16 +1,19 @@
 """Meross devices platform loader"""
 import asyncio
+import json
 import logging
 from datetime import datetime, timedelta
-from typing import List, Tuple, Dict, Optional, Collection
+from typing import List, Tuple, Dict, Optional, Collection, Callable, Set
 
 import homeassistant.helpers.config_validation as cv
 import voluptuous as vol
 from homeassistant import config_entries
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback, CALLBACK_TYPE
 from homeassistant.exceptions import ConfigEntryNotReady, ConfigEntryAuthFailed
+from homeassistant.helpers import device_registry as dr
 from homeassistant.helpers.entity import Entity
+from homeassistant.helpers.event import async_track_time_interval
 from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
 from meross_iot.controller.device import BaseDevice
 from meross_iot.http_api import MerossHttpClient, ErrorCodes
@@ -19,6 +22,7 @@ from meross_iot.model.credentials import MerossCloudCreds
 from meross_iot.model.enums import OnlineStatus, Namespace
 from meross_iot.model.exception import CommandTimeoutError
 from meross_iot.model.http.device import HttpDeviceInfo
+from meross_iot.model.push.generic import GenericPushNotification
 from meross_iot.model.http.exception import (
     TokenExpiredException,
     TooManyTokensException,
@@ -47,8 +51,21 @@ from .common import (
     CONF_HTTP_ENDPOINT, CONF_MQTT_SKIP_CERT_VALIDATION, HTTP_API_RE,
     HTTP_UPDATE_INTERVAL, DEVICE_LIST_COORDINATOR, calculate_id, DEFAULT_USER_AGENT, CONF_OPT_CUSTOM_USER_AGENT,
     CONF_OVERRIDE_MQTT_ENDPOINT, CONF_OPT_LAN, CONF_OPT_LAN_MQTT_ONLY, TRANSPORT_MODES_TO_ENUM,
-    MEROSS_DEFAULT_CLOUD_API_URL
+    MEROSS_DEFAULT_CLOUD_API_URL, ELECTRICITY_SAMPLERS, CONSUMPTION_CACHES, HUB_POLLERS, PUSH_ROUTERS,
+    DND_MODE_COORDINATORS, ERRORS, ERROR_SUMMARY_INTERVAL, ErrorRecorder, LOADED_PLATFORMS, METRICS,
+    DEVICE_REFRESHERS, BATTERY_STORE, POLL_PHASES, device_platforms,
+    DISCOVERY_CONCURRENCY,
+    HTTP_MIN_UPDATE_INTERVAL, HTTP_MAX_UPDATE_INTERVAL
 )
+from .battery import BatteryStore
+from .concurrency import polling
+from .coordinator import (get_consumption_update_interval, get_device_refresher, get_full_refresh_window,
+                          PollPhaseAllocator)
+from .metrics import IntegrationMetrics, get_metrics, measured
+from .push import get_push_router
+from .scheduler import SchedulingMerossManager, get_poll_rate_limit, get_max_concurrent_commands
+from .services import async_setup_services, async_unload_services
+from .snapshot import DeviceSnapshotStore
 from .version import MEROSS_IOT_VERSION
 
 _LOGGER = logging.getLogger(__name__)
@@ -110,21 +127,37 @@ class MerossCoordinator(DataUpdateCoordinator):
         self._skip_cert_validation = mqtt_skip_cert_validation
         self._mqtt_override_address = mqtt_override_address
         self._setup_done = False
+        self._initial_discovery_done = False
         self._ua_header = ua_header
 
         # Objects not to be initialized here
         self._client = None
         self._manager = None
+        self._snapshot_store = DeviceSnapshotStore(hass=hass, entry_id=config_entry.entry_id)
+        self._restored_devices: List[BaseDevice] = []
+
+        # Devices known to the platforms, indexed by internal id, and the platform callbacks to be notified
+        # whenever that set changes.
+        self._known_devices: Dict[str, BaseDevice] = {}
+        self._device_set_listeners: List[Callable[[List[BaseDevice], List[BaseDevice]], None]] = []
+
+        # Entity callbacks interested in the HTTP info of a specific device, indexed by device uuid, along with
+        # the data/outcome they were last notified about.
+        self._device_http_listeners: Dict[str, List[CALLBACK_TYPE]] = {}
+        self._last_dispatched_data: Optional[Dict[str, HttpDeviceInfo]] = None
+        self._last_dispatched_success: Optional[bool] = None
+
+        # Fingerprint of the last device list content received from the HTTP API
+        self._http_fingerprint: Optional[str] = None
 
         super().__init__(hass=hass, logger=_LOGGER, name="meross_http_coordinator", update_interval=update_interval,
-                         update_method=self._async_fetch_http_data)
+                         update_method=self._async_fetch_http_data, always_update=False)
 
+    @measured("http_fetch")
     async def _async_fetch_http_data(self):
         try:
             async with asyncio.timeout(10):
-                # Fetch devices and compose a quick-access dictionary
                 devices = await self._client.async_list_devices()
-                return {device.uuid: device for device in devices}
 
         except (BadLoginException, TokenExpiredException, UnauthorizedException) as err:
             # Raising ConfigEntryAuthFailed will cancel future updates
@@ -133,6 +166,39 @@ class MerossCoordinator(DataUpdateCoordinator):
         except HttpApiError as err:
             raise UpdateFailed(f"Error communicating with API: {err}")
 
+        # When the content of the list did not change, keep serving the very same data: the coordinator
+        # won't notify its listeners and the polling backs off.
+        fingerprint = _http_devices_fingerprint(devices)
+        if self.data is not None and fingerprint == self._http_fingerprint:
+            self._async_adapt_update_interval(changed=False)
+            return self.data
+
+        # Compose a quick-access dictionary
+        self._http_fingerprint = fingerprint
+        self._async_adapt_update_interval(changed=True)
+        return {device.uuid: device for device in devices}
+
+    @callback
+    def _async_adapt_update_interval(self, changed: bool) -> None:
+        interval = self.update_interval.total_seconds()
+        if changed:
+            # Never slow down when we were polling fast after a device event
+            interval = min(interval, HTTP_UPDATE_INTERVAL)
+        else:
+            interval = min(interval * 2, HTTP_MAX_UPDATE_INTERVAL)
+        self.update_interval = timedelta(seconds=interval)
+
+    async def _async_manager_push_received(self,
+                                           push_notification: GenericPushNotification,
+                                           target_devices: List[BaseDevice],
+                                           manager: MerossManager) -> None:
+        # Devices going online/offline or being (un)bound are likely to change the HTTP device list soon:
+        # poll it right away and keep polling fast for a while, as the cloud might take some time to reflect it.
+        if push_notification.namespace in (Namespace.SYSTEM_ONLINE, Namespace.CONTROL_BIND,
+                                           Namespace.CONTROL_UNBIND):
+            self.update_interval = timedelta(seconds=HTTP_MIN_UPDATE_INTERVAL)
+            await self.async_request_refresh()
+
     async def initial_setup(self):
         if self._setup_done:
             raise ValueError("This coordinator was already set up")
@@ -171,26 +237,189 @@ class MerossCoordinator(DataUpdateCoordinator):
             )
 
         # Now that we are logged in at HTTP api level, instantiate the manager.
-        self._manager = MerossManager(
+        self._manager = SchedulingMerossManager(
             http_client=self._client,
             mqtt_override_server=self._mqtt_override_address,
             auto_reconnect=True,
             mqtt_skip_cert_validation=self._skip_cert_validation,
+            metrics=get_metrics(self.hass),
+            error_recorder=self.hass.data[DOMAIN][ERRORS],
+            poll_rate_limit=get_poll_rate_limit(self._entry),
+            max_concurrent_commands=get_max_concurrent_commands(self._entry),
         )
 
+        self._manager.register_push_notification_handler_coroutine(self._async_manager_push_received)
+
         # Since we already have fetched for the DeviceList, publish it right away
+        self._http_fingerprint = _http_devices_fingerprint(http_devices)
         self.async_set_updated_data({device.uuid: device for device in http_devices})
 
-        # Print startup message, start the manager and issue a first discovery
+        # Rebuild the devices we have a valid snapshot for, so that platforms can add their entities right away.
+        # The initial discovery will revalidate them in background.
+        await self._snapshot_store.async_load()
+        restored = await self._snapshot_store.async_restore_devices(manager=self._manager, http_devices=http_devices)
+        _LOGGER.info("Restored %d Meross devices from snapshot", len(restored))
+        self._restored_devices = restored
+        self.async_update_device_set()
+
+        # Print startup message and start the manager. Device discovery is not awaited here: it is carried
+        # out by async_initial_discovery() once the platforms have been set up.
         print_startup_message(http_devices=self.data.values())
         _LOGGER.info("Starting meross manager")
         await self._manager.async_init()
-        _LOGGER.info("Discovering Meross devices...")
-        await self._manager.async_device_discovery()
 
         # If no exception is thrown so far, it means setup was successful
         self._setup_done = True
 
+    async def async_initial_discovery(self) -> None:
+        """
+        Discovers the devices listed by the HTTP API concurrently. Every device is reported to the platforms
+        as soon as its own discovery completes, so that slow or unreachable devices do not delay the others.
+        """
+        http_devices = list(self.data.values())
+        semaphore = asyncio.Semaphore(DISCOVERY_CONCURRENCY)
+
+        async def _async_discover(http_device: HttpDeviceInfo) -> None:
+            async with semaphore:
+                try:
+                    devices = await self._manager.async_device_discovery(update_subdevice_status=True,
+                                                                         meross_device_uuid=http_device.uuid,
+                                                                         cached_http_device_list=http_devices)
+                except Exception:
+                    log_exception(f"Discovery of device {http_device.dev_name} ({http_device.uuid}) failed",
+                                  logger=_LOGGER, recorder=self.hass.data[DOMAIN][ERRORS])
+                    return
+            self._snapshot_store.async_track_devices(self._enrolled_instances(devices))
+            self.async_update_device_set()
+
+        _LOGGER.info("Discovering %d Meross devices...", len(http_devices))
+        try:
+            await asyncio.gather(*(_async_discover(d) for d in http_devices))
+        finally:
+            self._initial_discovery_done = True
+        _LOGGER.info("Initial discovery completed")
+
+        # Known devices are only refreshed from the HTTP info by the discovery: a firmware update might have
+        # changed the abilities of the restored ones, and thus their device class. Those are rebuilt by reloading.
+        restored = self._enrolled_instances(self._restored_devices)
+        outdated = await self._snapshot_store.async_revalidate_devices(restored)
+        self._restored_devices = []
+        if len(outdated) > 0:
+            _LOGGER.info("Reloading the integration to rebuild %d devices whose abilities changed", len(outdated))
+            self.hass.config_entries.async_schedule_reload(self._entry.entry_id)
+
+    async def async_discover_devices(self, http_devices: Collection[HttpDeviceInfo]) -> None:
+        """Discovers the given devices and lets the platforms know about the ones that have just been enrolled"""
+        devices = await self._manager.async_device_discovery(update_subdevice_status=True,
+                                                             cached_http_device_list=http_devices)
+        self._snapshot_store.async_track_devices(self._enrolled_instances(devices))
+        self.async_update_device_set()
+
+    def _enrolled_instances(self, devices: Collection[BaseDevice]) -> List[BaseDevice]:
+        """
+        Maps the devices returned by a discovery to the instances enrolled into the manager registry, which are
+        the ones receiving the pushes. The discovery on MQTT connection, run by the manager on its own, might
+        enroll a device while we are discovering it too: in that case our discovery returns a duplicate object.
+        """
+        enrolled = {d.internal_id: d for d in self._manager.find_devices()}
+        return [enrolled[d.internal_id] for d in devices if d is not None and d.internal_id in enrolled]
+
+    @property
+    def initial_discovery_done(self) -> bool:
+        return self._initial_discovery_done
+
+    @callback
+    def async_add_device_http_listener(self, device_uuid: str, update_callback: CALLBACK_TYPE) -> CALLBACK_TYPE:
+        """
+        Registers a callback that gets invoked only when the HTTP info of the given device changes
+        (online status or name) or when the coordinator availability changes.
+        Returns a function that unregisters the callback.
+        """
+        listeners = self._device_http_listeners.setdefault(device_uuid, [])
+        listeners.append(update_callback)
+
+        @callback
+        def remove_listener() -> None:
+            if update_callback in listeners:
+                listeners.remove(update_callback)
+            if len(listeners) == 0 and self._device_http_listeners.get(device_uuid) is listeners:
+                del self._device_http_listeners[device_uuid]
+
+        return remove_listener
+
+    @callback
+    def async_update_listeners(self) -> None:
+        self._async_dispatch_device_http_changes()
+        super().async_update_listeners()
+
+    @callback
+    def _async_dispatch_device_http_changes(self) -> None:
+        new_data = self.data if self.data is not None else {}
+        old_data = self._last_dispatched_data
+        availability_changed = self._last_dispatched_success != self.last_update_success
+        self._last_dispatched_data = new_data
+        self._last_dispatched_success = self.last_update_success
+
+        for device_uuid, listeners in list(self._device_http_listeners.items()):
+            if not availability_changed and old_data is not None and \
+                    not _http_device_changed(old_data.get(device_uuid), new_data.get(device_uuid)):
+                continue
+            for update_callback in list(listeners):
+                update_callback()
+
+    @callback
+    def async_add_device_set_listener(
+            self,
+            update_callback: Callable[[List[BaseDevice], List[BaseDevice]], None]
+    ) -> Callable[[], None]:
+        """
+        Registers a callback that gets invoked with the lists of added and removed devices whenever the set of
+        devices known to the manager changes. The devices known so far are reported right away as added.
+        Returns a function that unregisters the callback.
+        """
+        self._device_set_listeners.append(update_callback)
+        if len(self._known_devices) > 0:
+            update_callback(list(self._known_devices.values()), [])
+
+        @callback
+        def remove_listener() -> None:
+            if update_callback in self._device_set_listeners:
+                self._device_set_listeners.remove(update_callback)
+
+        return remove_listener
+
+    @callback
+    def async_update_device_set(self) -> None:
+        """
+        Compares the devices known to the manager with the last known set and notifies the differences.
+        Devices are always read from the manager registry, so platforms get the instances receiving the pushes.
+        """
+        if self._manager is None:
+            return
+
+        current_devices = {d.internal_id: d for d in self._manager.find_devices()}
+        added = [d for device_id, d in current_devices.items() if device_id not in self._known_devices]
+        removed = [d for device_id, d in self._known_devices.items() if device_id not in current_devices]
+        self._known_devices = current_devices
+        if len(added) == 0 and len(removed) == 0:
+            return
+
+        _LOGGER.debug("Device set changed: %d devices added, %d devices removed", len(added), len(removed))
+        for update_callback in list(self._device_set_listeners):
+            update_callback(added, removed)
+
+    @callback
+    def async_relinquish_unlisted_devices(self) -> None:
+        """Drops from the manager the devices (and their subdevices) no more listed by the HTTP API"""
+        if self._manager is None or self.data is None or not self.last_update_success:
+            return
+        for device in self._manager.find_devices():
+            if device.uuid in self.data:
+                continue
+            _LOGGER.info("Device %s (%s) is no more listed by the HTTP API, removing it", device.name, device.uuid)
+            # The manager does not expose any public way of dropping devices, so we need to access its registry
+            self._manager._device_registry.relinquish_device(device.internal_id)
+
     @property
     def manager(self) -> MerossManager:
         return self._manager
@@ -201,10 +430,14 @@ class MerossCoordinator(DataUpdateCoordinator):
 
 
 class MerossDevice(Entity):
+    # Namespaces of the push notifications the entity reacts to, on top of the device-wide ones (online, unbind and
+    # full updates). None means all of them.
+    _push_namespaces: Optional[Tuple[Namespace, ...]] = None
+
     def __init__(self,
                  device: BaseDevice,
                  channel: int,
-                 device_list_coordinator: DataUpdateCoordinator[Dict[str, HttpDeviceInfo]],
+                 device_list_coordinator: MerossCoordinator,
                  platform: str,
                  supplementary_classifiers: Optional[List[str]] = None,
                  override_channel_name: str = None):
@@ -213,6 +446,7 @@ class MerossDevice(Entity):
         self._channel_id = channel
         self._last_http_state = None
         self._cb_async_remove_listener = None
+        self._cb_async_remove_push_listener = None
 
         base_name = f"{device.name} ({device.type})"
         if supplementary_classifiers is not None:
@@ -235,16 +469,25 @@ class MerossDevice(Entity):
     def should_poll(self) -> bool:
         return False
 
+    @measured("update")
+    @polling
     async def async_update(self):
         if self.online:
             try:
-                await self._device.async_update()
+                # Sibling entities share the very same full refresh of the device
+                refresher = get_device_refresher(self.hass, self._device,
+                                                 get_full_refresh_window(self.platform.config_entry))
+                await refresher.async_refresh()
             except CommandTimeoutError as e:
-                log_exception(logger=_LOGGER, device=self._device)
+                # Timeouts are reported by the device health tracking, rather than one by one
+                _LOGGER.debug("Update of device %s timed out: %s", self._device.name, e.message)
 
     def _http_data_changed(self) -> None:
         new_data = self._coordinator.data.get(self._device.uuid)
-        if self._last_http_state is not None and self._last_http_state.online_status != OnlineStatus.ONLINE and new_data.online_status == OnlineStatus.ONLINE:
+        if new_data is None:
+            # The device is no more listed by the HTTP API: just refresh the entity availability
+            self.async_schedule_update_ha_state(force_refresh=False)
+        elif self._last_http_state is not None and self._last_http_state.online_status != OnlineStatus.ONLINE and new_data.online_status == OnlineStatus.ONLINE:
             self._last_http_state = new_data
             self.async_schedule_update_ha_state(force_refresh=True)
         else:
@@ -308,17 +551,38 @@ class MerossDevice(Entity):
             self.async_schedule_update_ha_state(force_refresh=full_update)
 
     async def async_added_to_hass(self) -> None:
-        self._device.register_push_notification_handler_coroutine(self._async_push_notification_received)
-        self._cb_async_remove_listener = self._coordinator.async_add_listener(self._http_data_changed)
+        # Pushes are routed by the device router, which only wakes us for our channel and namespaces
+        router = get_push_router(self.hass, self._device)
+        self._cb_async_remove_push_listener = router.async_subscribe(self._async_push_notification_received,
+                                                                     channel=self._channel_id,
+                                                                     namespaces=self._push_namespaces)
+        self._cb_async_remove_listener = self._coordinator.async_add_device_http_listener(self._device.uuid,
+                                                                                           self._http_data_changed)
         self.hass.data[DOMAIN]["ADDED_ENTITIES_IDS"].add(self.unique_id)
 
     async def async_will_remove_from_hass(self) -> None:
-        self._device.unregister_push_notification_handler_coroutine(self._async_push_notification_received)
+        if self._cb_async_remove_push_listener is not None:
+            self._cb_async_remove_push_listener()
         if self._cb_async_remove_listener is not None:
             self._cb_async_remove_listener()
         self.hass.data[DOMAIN]["ADDED_ENTITIES_IDS"].remove(self.unique_id)
 
 
+@callback
+def _async_release_device(hass: HomeAssistant, device: BaseDevice) -> None:
+    """Shuts down the coordinators and the push router bound to a device that is gone"""
+    for key in (ELECTRICITY_SAMPLERS, CONSUMPTION_CACHES, HUB_POLLERS, DND_MODE_COORDINATORS):
+        coordinator = hass.data[DOMAIN][key].pop(device.internal_id, None)
+        if coordinator is not None:
+            hass.async_create_task(coordinator.async_shutdown())
+    router = hass.data[DOMAIN][PUSH_ROUTERS].pop(device.internal_id, None)
+    if router is not None:
+        router.async_close()
+    refresher = hass.data[DOMAIN][DEVICE_REFRESHERS].pop(device.internal_id, None)
+    if refresher is not None:
+        refresher.close()
+
+
 async def get_or_test_creds(
         creds: MerossCloudCreds = None,
         http_api_url: str = MEROSS_DEFAULT_CLOUD_API_URL,
@@ -342,6 +606,19 @@ async def get_or_test_creds(
     return http_client, http_devices, renewed
 
 
+def _http_devices_fingerprint(http_devices: Collection[HttpDeviceInfo]) -> str:
+    """Returns a value that only changes when the content of the given HTTP device list changes"""
+    return json.dumps(sorted((d.to_dict() for d in http_devices), key=lambda d: d["uuid"]),
+                      sort_keys=True, default=str)
+
+
+def _http_device_changed(old: Optional[HttpDeviceInfo], new: Optional[HttpDeviceInfo]) -> bool:
+    """Tells whether the HTTP info relevant to the entities (online status and name) differs"""
+    if old is None or new is None:
+        return old is not new
+    return old.online_status != new.online_status or old.dev_name != new.dev_name
+
+
 def _http_info_changed(known: Collection[HttpDeviceInfo], discovered: Collection[HttpDeviceInfo]) -> bool:
     """Tells when a new device is discovered among the known ones"""
     known_ids = [dev.uuid for dev in known]
@@ -393,6 +670,18 @@ async def async_setup_entry(hass: HomeAssistant, config_entry: ConfigEntry):
     # Initialize the HASS structure
     hass.data[DOMAIN] = {}
     hass.data[DOMAIN]["ADDED_ENTITIES_IDS"] = set()
+    hass.data[DOMAIN][ELECTRICITY_SAMPLERS] = {}
+    hass.data[DOMAIN][CONSUMPTION_CACHES] = {}
+    hass.data[DOMAIN][HUB_POLLERS] = {}
+    hass.data[DOMAIN][DND_MODE_COORDINATORS] = {}
+    hass.data[DOMAIN][PUSH_ROUTERS] = {}
+    hass.data[DOMAIN][LOADED_PLATFORMS] = set()
+    hass.data[DOMAIN][METRICS] = IntegrationMetrics()
+    hass.data[DOMAIN][DEVICE_REFRESHERS] = {}
+    hass.data[DOMAIN][POLL_PHASES] = PollPhaseAllocator()
+    hass.data[DOMAIN][ERRORS] = ErrorRecorder()
+    hass.data[DOMAIN][BATTERY_STORE] = BatteryStore(hass=hass, entry_id=config_entry.entry_id)
+    await hass.data[DOMAIN][BATTERY_STORE].async_load()
 
     # Retrieve options we need
     ua_header = config_entry.options.get(CONF_OPT_CUSTOM_USER_AGENT, DEFAULT_USER_AGENT)
@@ -415,29 +704,85 @@ async def async_setup_entry(hass: HomeAssistant, config_entry: ConfigEntry):
         )
 
         # Initiate the coordinator. This method will also make sure to login to the API,
-        # instantiates the manager, starts it and issues a first discovery.
+        # instantiates the manager and starts it.
         await meross_coordinator.initial_setup()
         manager = meross_coordinator.manager
         hass.data[DOMAIN][MANAGER] = manager
         hass.data[DOMAIN][DEVICE_LIST_COORDINATOR] = meross_coordinator
 
-        # Once the manager is ok and the first discovery was issued, we can proceed with platforms setup.
-        await hass.config_entries.async_forward_entry_setups(config_entry, MEROSS_PLATFORMS)
+        # Once the manager is ok, we can proceed with platforms setup. Only the platforms needed by the devices
+        # restored from the snapshot are loaded now: the others are loaded as soon as the background discovery
+        # enrolls the first device needing them. Platforms receive the devices one by one, as they get enrolled.
+        loaded_platforms: Set[str] = hass.data[DOMAIN][LOADED_PLATFORMS]
+
+        def _missing_platforms(devices: Collection[BaseDevice]) -> List[str]:
+            needed = set().union(*(device_platforms(d) for d in devices))
+            return [p for p in MEROSS_PLATFORMS if p in needed and p not in loaded_platforms]
+
+        initial_platforms = _missing_platforms(manager.find_devices())
+        # The sensor platform also hosts the integration-wide metric sensors, so it is loaded whatever the devices
+        if HA_SENSOR not in initial_platforms:
+            initial_platforms.append(HA_SENSOR)
+        loaded_platforms.update(initial_platforms)
+        await hass.config_entries.async_forward_entry_setups(config_entry, initial_platforms)
+
+        @callback
+        def _device_set_changed(added: List[BaseDevice], removed: List[BaseDevice]) -> None:
+            # Entities of the removed devices go away along with their device registry entry
+            device_registry = dr.async_get(hass)
+            for device in removed:
+                entry = device_registry.async_get_device(identifiers={(DOMAIN, device.internal_id)})
+                if entry is not None:
+                    _LOGGER.info("Removing device %s (%s) and its entities from HA", device.name, device.uuid)
+                    device_registry.async_update_device(entry.id, remove_config_entry_id=config_entry.entry_id)
+                _async_release_device(hass, device)
+
+            platforms = _missing_platforms(added)
+            if len(platforms) == 0:
+                return
+            _LOGGER.info("Loading platforms %s for the newly discovered devices", ", ".join(platforms))
+            loaded_platforms.update(platforms)
+            config_entry.async_create_background_task(
+                hass, hass.config_entries.async_late_forward_entry_setups(config_entry, platforms),
+                "meross_cloud platforms setup")
+
+        config_entry.async_on_unload(meross_coordinator.async_add_device_set_listener(_device_set_changed))
+        config_entry.async_create_background_task(hass, meross_coordinator.async_initial_discovery(),
+                                                  "meross_cloud initial discovery")
 
         def _http_api_polled(*args, **kwargs):
+            # Devices no more listed by the HTTP API are dropped. The manager might also have enrolled/relinquished
+            # devices on its own (e.g. after a reconnection or an unbind).
+            meross_coordinator.async_relinquish_unlisted_devices()
+            meross_coordinator.async_update_device_set()
+
+            # New devices will be picked up by the initial discovery, if still running
+            if not meross_coordinator.initial_discovery_done:
+                return
+
             # Whenever a new HTTP device is seen, we issue a discovery
             discovered_devices = meross_coordinator.data
             known_devices = manager.find_devices(device_uuids=discovered_devices.keys())
             if _http_info_changed(known_devices, discovered_devices.values()):
                 _LOGGER.info("The HTTP API has found new devices that were unknown to us. Triggering discovery.")
-                hass.create_task(manager.async_device_discovery(update_subdevice_status=True,
-                                                                cached_http_device_list=discovered_devices.values()))
+                hass.create_task(meross_coordinator.async_discover_devices(discovered_devices.values()))
 
         # Register a handler for HTTP events so that we can check for new devices and trigger
         # a discovery when needed
         config_entry.async_on_unload(meross_coordinator.async_add_listener(_http_api_polled))
         config_entry.async_on_unload(config_entry.add_update_listener(update_listener))
 
+        # Repeated errors are summed up periodically rather than logged one by one
+        errors: ErrorRecorder = hass.data[DOMAIN][ERRORS]
+
+        @callback
+        def _flush_errors(now: datetime) -> None:
+            errors.flush()
+
+        config_entry.async_on_unload(
+            async_track_time_interval(hass, _flush_errors, timedelta(seconds=ERROR_SUMMARY_INTERVAL)))
+
+        async_setup_services(hass)
         return True
 
     except TooManyTokensException:
@@ -446,7 +791,7 @@ async def async_setup_entry(hass: HomeAssistant, config_entry: ConfigEntry):
             "The Remote API refused to issue a new one."
         )
         notify_error(hass, "http_connection", "Meross Cloud", msg)
-        log_exception(msg, logger=_LOGGER)
+        log_exception(msg, logger=_LOGGER, recorder=hass.data[DOMAIN][ERRORS])
         raise ConfigEntryAuthFailed("Too many tokens have been issued")
 
     except (UnauthorizedException, HttpApiError) as ex:
@@ -466,7 +811,7 @@ async def async_setup_entry(hass: HomeAssistant, config_entry: ConfigEntry):
                 "Could not connect to the Meross cloud. Please check"
                 " your internet connection and your Meross credentials",
             )
-            log_exception(msg, logger=_LOGGER)
+            log_exception(msg, logger=_LOGGER, recorder=hass.data[DOMAIN][ERRORS])
             raise ConfigEntryNotReady()
 
 
@@ -483,6 +828,20 @@ async def update_listener(hass, entry):
     # to do so.
     manager._http_client._ua_header = custom_ua
 
+    # Apply the new consumption refresh cadence to the caches already running
+    consumption_update_interval = get_consumption_update_interval(entry)
+    for cache in hass.data[DOMAIN][CONSUMPTION_CACHES].values():
+        cache.update_interval = consumption_update_interval
+
+    # Same for the window full device refreshes are shared within
+    full_refresh_window = get_full_refresh_window(entry)
+    for refresher in hass.data[DOMAIN][DEVICE_REFRESHERS].values():
+        refresher.freshness_window = full_refresh_window
+
+    # And for the pace polling commands are sent at
+    manager.poll_limiter.rate = get_poll_rate_limit(entry)
+    manager.command_slots.max_in_flight = get_max_concurrent_commands(entry)
+
 
 async def async_unload_entry(hass, entry):
     """Unload a config entry."""
@@ -490,10 +849,19 @@ async def async_unload_entry(hass, entry):
     _LOGGER.info("Removing Meross Cloud integration.")
     _LOGGER.info("Cleaning up resources...")
 
-    for platform in MEROSS_PLATFORMS:
+    for platform in [p for p in MEROSS_PLATFORMS if p in hass.data[DOMAIN][LOADED_PLATFORMS]]:
         _LOGGER.info(f"Cleaning up platform {platform}")
         await hass.config_entries.async_forward_entry_unload(entry, platform)
 
+    async_unload_services(hass)
+
+    # Detach the push handlers from the device objects, so that they do not keep the coordinators alive
+    # nor handle pushes twice once the entry is set up again
+    for coordinator in [*hass.data[DOMAIN][ELECTRICITY_SAMPLERS].values(), *hass.data[DOMAIN][HUB_POLLERS].values()]:
+        await coordinator.async_shutdown()
+    for router in hass.data[DOMAIN][PUSH_ROUTERS].values():
+        router.async_close()
+
     _LOGGER.info("Stopping manager...")
     manager = hass.data[DOMAIN][MANAGER]
     # TODO: Invalidate the token?
@@ -0,0 +1,73 @@
+"""Persistent, slow-paced schedule of the subdevice battery readings"""
+import logging
+import random
+import time
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.storage import Store
+from meross_iot.model.plugin.hub import BatteryInfo
+
+from .common import DOMAIN, BATTERY_UPDATE_INTERVAL, BATTERY_UPDATE_JITTER
+
+_LOGGER = logging.getLogger(__name__)
+
+STORAGE_VERSION = 1
+STORAGE_KEY = f"{DOMAIN}.batteries"
+BATTERY_SAVE_DELAY = 60
+
+
+class BatteryStore:
+    """
+    Keeps the last battery reading of every subdevice, along with the time its next refresh is due, into
+    HA storage. Battery levels change over weeks, so refreshes are spaced by hours and spread with a random
+    jitter: restarts do not trigger a burst of requests, as the schedule survives them. A subdevice coming
+    back online is refreshed early.
+    """
+
+    def __init__(self, hass: HomeAssistant, entry_id: str):
+        self._store = Store(hass, STORAGE_VERSION, f"{STORAGE_KEY}.{entry_id}")
+        # Subdevice id -> {"value": battery charge, "sampled_at": epoch, "next_refresh": epoch}
+        self._batteries: Dict[str, dict] = {}
+
+    async def async_load(self) -> None:
+        data = await self._store.async_load()
+        self._batteries = data.get("batteries", {}) if data is not None else {}
+
+    def get(self, subdevice_id: str) -> Optional[BatteryInfo]:
+        """Returns the last known battery reading of the given subdevice, if any"""
+        battery = self._batteries.get(subdevice_id)
+        if battery is None:
+            return None
+        return BatteryInfo(battery_charge=battery["value"],
+                           sample_ts=datetime.fromtimestamp(battery["sampled_at"], tz=timezone.utc))
+
+    def is_due(self, subdevice_id: str) -> bool:
+        """Tells whether the battery of the given subdevice should be refreshed"""
+        battery = self._batteries.get(subdevice_id)
+        return battery is None or battery["next_refresh"] <= time.time()
+
+    @callback
+    def async_record(self, subdevice_id: str, value: int) -> BatteryInfo:
+        """Stores a fresh reading of the given subdevice and schedules its next refresh"""
+        now = time.time()
+        self._batteries[subdevice_id] = {
+            "value": value,
+            "sampled_at": now,
+            "next_refresh": now + BATTERY_UPDATE_INTERVAL + random.uniform(0, BATTERY_UPDATE_JITTER),
+        }
+        self._store.async_delay_save(self._data_to_save, BATTERY_SAVE_DELAY)
+        return self.get(subdevice_id)
+
+    @callback
+    def async_request_refresh(self, subdevice_id: str) -> None:
+        """Makes the battery of the given subdevice due right away"""
+        battery = self._batteries.get(subdevice_id)
+        if battery is not None:
+            _LOGGER.debug("Subdevice %s came back online, refreshing its battery early", subdevice_id)
+            battery["next_refresh"] = time.time()
+
+    @callback
+    def _data_to_save(self) -> dict:
+        return {"batteries": self._batteries}
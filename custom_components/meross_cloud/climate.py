@@ -17,6 +17,7 @@ from . import MerossDevice
 from .common import (DOMAIN, MANAGER, HA_CLIMATE, DEVICE_LIST_COORDINATOR)
 
 _LOGGER = logging.getLogger(__name__)
+PARALLEL_UPDATES = 0
 
 
 class ValveEntityWrapper(MerossDevice, ClimateEntity):
@@ -259,11 +260,9 @@ class ThermostatEntityWrapper(MerossDevice, ClimateEntity):
 
 
 async def async_setup_entry(hass: HomeAssistant, config_entry, async_add_entities):
-    def entity_adder_callback():
-        """Discover and adds new Meross entities"""
-        manager: MerossManager = hass.data[DOMAIN][MANAGER]  # type
+    def entity_adder_callback(devices: List[BaseDevice], removed: List[BaseDevice]):
+        """Adds the Meross entities of the newly discovered devices"""
         coordinator = hass.data[DOMAIN][DEVICE_LIST_COORDINATOR]
-        devices = manager.find_devices()
         new_entities = []
 
         # Handle smart valves
@@ -297,10 +296,10 @@ async def async_setup_entry(hass: HomeAssistant, config_entry, async_add_entitie
         # Add all entities to HA
         async_add_entities(new_entities, True)
 
+    # The coordinator immediately reports the devices it already knows and then only notifies the ones that
+    # get added or removed afterwards.
     coordinator = hass.data[DOMAIN][DEVICE_LIST_COORDINATOR]
-    coordinator.async_add_listener(entity_adder_callback)
-    # Run the entity adder a first time during setup
-    entity_adder_callback()
+    config_entry.async_on_unload(coordinator.async_add_device_set_listener(entity_adder_callback))
 
 # TODO: Implement entry unload
 # TODO: Unload entry
@@ -0,0 +1,50 @@
+"""Coalescing of the commands issued in rapid succession to the same device channel"""
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class CommandCoalescer:
+    """
+    Sends the attribute changes requested for a device channel right away when the channel is idle. Changes
+    requested while a command is in flight are merged into a single state, which is sent as soon as that command
+    completes. Later changes override earlier ones, so that only the last intended state goes over the wire
+    (e.g. while dragging a brightness slider). Passing None for an attribute drops any pending change for it.
+    """
+
+    def __init__(self, name: str, send: Callable[[Dict[str, Any]], Awaitable[None]]):
+        self._name = name
+        self._send = send
+        self._pending: Dict[str, Any] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        # Makes sure that merged states are sent one at a time, in the same order they were collected
+        self._send_lock = asyncio.Lock()
+
+    async def async_submit(self, **changes) -> None:
+        """Merges the given changes into the pending state and waits until that state has been sent"""
+        for key, value in changes.items():
+            if value is None:
+                self._pending.pop(key, None)
+            else:
+                self._pending[key] = value
+
+        # At most one flush waits for the in-flight command: later changes join it
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._async_flush())
+            # Retrieve the outcome even when every caller gave up on it
+            self._flush_task.add_done_callback(lambda f: f.cancelled() or f.exception())
+
+        # Callers being cancelled must not cancel the command on behalf of the others
+        await asyncio.shield(self._flush_task)
+
+    async def _async_flush(self) -> None:
+        async with self._send_lock:
+            # Changes submitted from now on will be part of the next command
+            state = self._pending
+            self._pending = {}
+            self._flush_task = None
+
+            _LOGGER.debug("Sending coalesced command to %s: %s", self._name, state)
+            await self._send(state)
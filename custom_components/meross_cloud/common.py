@@ -1,8 +1,23 @@
 import logging
 import re
-from typing import Dict, List
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Set, Tuple
 
-from meross_iot.controller.device import BaseDevice
+from meross_iot.controller.device import BaseDevice, GenericSubDevice
+from meross_iot.controller.mixins.consumption import ConsumptionXMixin
+from meross_iot.controller.mixins.diffuser_light import DiffuserLightMixin
+from meross_iot.controller.mixins.diffuser_spray import DiffuserSprayMixin
+from meross_iot.controller.mixins.dnd import SystemDndMixin
+from meross_iot.controller.mixins.electricity import ElectricityMixin
+from meross_iot.controller.mixins.garage import GarageOpenerMixin
+from meross_iot.controller.mixins.light import LightMixin
+from meross_iot.controller.mixins.roller_shutter import RollerShutterTimerMixin
+from meross_iot.controller.mixins.spray import SprayMixin
+from meross_iot.controller.mixins.thermostat import ThermostatModeMixin, ThermostatModeBMixin
+from meross_iot.controller.mixins.toggle import ToggleXMixin, ToggleMixin
+from meross_iot.controller.subdevice import Mts100v3Valve
 from meross_iot.manager import TransportMode
 
 from . import version
@@ -21,6 +36,17 @@ DOMAIN = "meross_cloud"
 ATTR_CONFIG = "config"
 MANAGER = "manager"
 DEVICE_LIST_COORDINATOR = "device_list_coordinator"
+ELECTRICITY_SAMPLERS = "electricity_samplers"
+CONSUMPTION_CACHES = "consumption_caches"
+HUB_POLLERS = "hub_pollers"
+DND_MODE_COORDINATORS = "dnd_mode_coordinators"
+PUSH_ROUTERS = "push_routers"
+LOADED_PLATFORMS = "loaded_platforms"
+METRICS = "metrics"
+DEVICE_REFRESHERS = "device_refreshers"
+BATTERY_STORE = "battery_store"
+POLL_PHASES = "poll_phases"
+ERRORS = "errors"
 LIMITER = "limiter"
 CLOUD_HANDLER = "cloud_handler"
 MEROSS_MANAGER = "%s.%s" % (DOMAIN, MANAGER)
@@ -34,6 +60,10 @@ HA_FAN = "fan"
 HA_HUMIDIFIER = "humidifier"
 MEROSS_PLATFORMS = (HA_SWITCH, HA_LIGHT, HA_COVER, HA_SENSOR, HA_CLIMATE, HA_HUMIDIFIER)
 CONNECTION_TIMEOUT_THRESHOLD = 5
+DISCOVERY_CONCURRENCY = 10              # Max number of devices discovered at the same time
+BULK_SET_CONCURRENCY = 10               # Max number of devices controlled at the same time by the bulk_set service
+DEVICE_MAX_IN_FLIGHT_COMMANDS = 1       # Max number of commands awaiting a response from the same device
+MAX_CONCURRENT_COMMANDS = 16            # Max number of commands awaiting a response across all the devices
 
 CONF_STORED_CREDS = "stored_credentials"
 CONF_MQTT_SKIP_CERT_VALIDATION = "skip_mqtt_cert_validation"
@@ -54,9 +84,35 @@ CONF_OPT_LAN = "lan_transport_mode"
 CONF_OPT_LAN_MQTT_ONLY = "conf_opt_lan_mqtt_only"
 CONF_OPT_LAN_HTTP_FIRST = "conf_opt_lan_http_first"
 CONF_OPT_LAN_HTTP_FIRST_ONLY_GET = "conf_opt_lan_http_first_only_get"
+CONF_OPT_CONSUMPTION_UPDATE_INTERVAL = "consumption_update_interval"
+CONF_OPT_FULL_REFRESH_WINDOW = "full_refresh_window"
+CONF_OPT_POLL_RATE_LIMIT = "poll_rate_limit"
+CONF_OPT_MAX_CONCURRENT_COMMANDS = "max_concurrent_commands"
 
 HA_SENSOR_POLL_INTERVAL_SECONDS = 30     # HA sensor polling interval
 HTTP_UPDATE_INTERVAL = 120               # Meross Cloud "discovery" interval
+HTTP_MIN_UPDATE_INTERVAL = 15            # Discovery interval right after devices went online/offline or got (un)bound
+HTTP_MAX_UPDATE_INTERVAL = 960           # Discovery interval the polling backs off to while the device list is stable
+CONSUMPTION_UPDATE_INTERVAL = 900        # Energy consumption history refresh interval
+DND_MODE_UPDATE_INTERVAL = 600           # Do-not-disturb mode refresh interval, as mode changes are never pushed
+FULL_REFRESH_WINDOW = 30                 # Age under which a full device refresh is reused by sibling entities
+BATTERY_UPDATE_INTERVAL = 43200          # Subdevice battery refresh interval
+BATTERY_UPDATE_JITTER = 21600            # Max random delay added to every battery refresh, to spread them
+REFRESH_REQUEST_COOLDOWN_SECONDS = 1     # Window used to collapse refresh requests of sibling entities
+POLL_STARTUP_SPREAD_SECONDS = 30         # Window over which the first refreshes of the device coordinators are spread
+MDNS_DISCOVERY_TIMEOUT_SECONDS = 5       # Max time spent looking for the local API/MQTT services
+MDNS_DISCOVERY_GRACE_SECONDS = 0.5       # Time left to other services to answer once a matching pair is found
+MDNS_RESOLVE_TIMEOUT_MS = 3000           # Max time spent resolving a single mDNS service
+METRICS_RATE_WINDOW_SECONDS = 60         # Window the command rates exposed by the diagnostics are averaged over
+POLL_RATE_LIMIT = 10                     # Max polling commands per second sent across all the devices
+COMMAND_TIMEOUT_MIN = 2                  # Lower bound of the adaptive polling command timeout
+COMMAND_TIMEOUT_RTT_FACTOR = 3           # Adaptive polling timeout, as a multiple of the observed p95 round-trip time
+COMMAND_RTT_SAMPLES = 50                 # Round-trip times kept per device (and per device type)
+CIRCUIT_BREAKER_THRESHOLD = 3            # Timeouts in a row after which polls to a device are paused
+CIRCUIT_BREAKER_BACKOFF = 30             # First pause of the polls to an unresponsive device, doubled at every failure
+CIRCUIT_BREAKER_MAX_BACKOFF = 900        # Longest pause of the polls to an unresponsive device
+FAILURE_LOG_INTERVAL = 300               # Min time between two reports of the timeouts of the same device
+ERROR_SUMMARY_INTERVAL = 3600            # Interval between two summaries of the repeated errors of the devices
 UNIT_PERCENTAGE = "%"
 
 ATTR_API_CALLS_PER_SECOND = "api_calls_per_second"
@@ -108,15 +164,88 @@ def notify_error(hass, notification_id, title, message):
     )
 
 
-def log_exception(
-        message: str = None, logger: logging = None, device: BaseDevice = None
-):
-    if logger is None:
-        logger = logging.getLogger(__name__)
+class ErrorRecorder:
+    """
+    Keeps in memory, for every device and error type, how many errors occurred along with the first and the
+    last occurrence. Only the first occurrence gets logged with its full trace: the following ones are summed up
+    in a single line by flush(), which is meant to be called periodically. Errors already reported by their
+    source (e.g. the timeouts reported by the device health tracking) are only counted.
+    """
 
-    if message is None:
-        message = "An exception occurred"
+    def __init__(self):
+        # (device uuid, error type) -> counters
+        self._errors: Dict[Tuple[Optional[str], str], dict] = {}
+
+    def record(self, logger: logging.Logger, message: str, device: Optional[BaseDevice]) -> None:
+        """Records the exception being handled, logging its trace the first time it occurs on the device"""
+        error = sys.exc_info()[1]
+        error_type = type(error).__name__ if error is not None else "Error"
+        first = self._count(uuid=device.uuid if device is not None else None,
+                            device_name=device.name if device is not None else None,
+                            error_type=error_type, message=message, logger=logger)
+        if first:
+            logger.exception(_format_error(message, device))
+        else:
+            logger.debug("%s error on device %s: %s", error_type, device.name if device is not None else
+                         "<Unavailable>", message)
+
+    def count(self, uuid: str, device_name: str, error_type: str, message: str) -> None:
+        """Counts an error whose occurrences are reported by its source"""
+        self._count(uuid=uuid, device_name=device_name, error_type=error_type, message=message, logger=None)
 
+    def _count(self, uuid: Optional[str], device_name: Optional[str], error_type: str, message: str,
+               logger: Optional[logging.Logger]) -> bool:
+        now = time.time()
+        entry = self._errors.get((uuid, error_type))
+        if entry is None:
+            self._errors[(uuid, error_type)] = {
+                "device": device_name,
+                "count": 1,
+                "first_seen": now,
+                "last_seen": now,
+                "last_message": message,
+                "logger": logger,
+                "unreported": 0,
+                "last_report": now,
+            }
+            return True
+
+        entry["count"] += 1
+        entry["last_seen"] = now
+        entry["last_message"] = message
+        entry["unreported"] += 1
+        return False
+
+    def flush(self) -> None:
+        """Logs a summary line for every error that occurred again since the last summary"""
+        now = time.time()
+        for (uuid, error_type), entry in self._errors.items():
+            if entry["logger"] is None or entry["unreported"] == 0:
+                continue
+            entry["logger"].warning("%d more %s errors occurred on device %s since %s (%d in total); "
+                                    "last one: \"%s\"", entry["unreported"], error_type,
+                                    entry["device"] or "<Unavailable>", _isoformat(entry["last_report"]),
+                                    entry["count"], entry["last_message"])
+            entry["unreported"] = 0
+            entry["last_report"] = now
+
+    def as_list(self) -> List[dict]:
+        return [{
+            "device_uuid": uuid,
+            "device": entry["device"],
+            "error": error_type,
+            "count": entry["count"],
+            "first_seen": _isoformat(entry["first_seen"]),
+            "last_seen": _isoformat(entry["last_seen"]),
+            "last_message": entry["last_message"],
+        } for (uuid, error_type), entry in self._errors.items()]
+
+
+def _isoformat(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc).isoformat()
+
+
+def _format_error(message: str, device: Optional[BaseDevice]) -> str:
     device_info = "<Unavailable>"
     if device is not None:
         device_info = (
@@ -127,7 +256,7 @@ def log_exception(
             f"\tFW Version: {device.firmware_version}"
         )
 
-    formatted_message = (
+    return (
         f"Error occurred.\n"
         f"-------------------------------------\n"
         f"Component version: {MEROSS_IOT_VERSION}\n"
@@ -135,7 +264,41 @@ def log_exception(
         f"{device_info}\n"
         f'Error Message: "{message}"'
     )
-    logger.exception(formatted_message)
+
+
+def log_exception(
+        message: str = None, logger: logging = None, device: BaseDevice = None, recorder: ErrorRecorder = None
+):
+    if logger is None:
+        logger = logging.getLogger(__name__)
+
+    if message is None:
+        message = "An exception occurred"
+
+    if recorder is None:
+        logger.exception(_format_error(message, device))
+    else:
+        recorder.record(logger=logger, message=message, device=device)
+
+
+def device_platforms(device: BaseDevice) -> Set[str]:
+    """Returns the HA platforms exposing entities for the given device, mirroring the platforms setup filters"""
+    platforms = set()
+    if isinstance(device, (ToggleXMixin, ToggleMixin)) and not isinstance(device, (GarageOpenerMixin, LightMixin)):
+        platforms.add(HA_SWITCH)
+    if isinstance(device, SystemDndMixin):
+        platforms.add(HA_SWITCH)
+    if isinstance(device, (LightMixin, DiffuserLightMixin)):
+        platforms.add(HA_LIGHT)
+    if isinstance(device, (GarageOpenerMixin, RollerShutterTimerMixin)):
+        platforms.add(HA_COVER)
+    if isinstance(device, (GenericSubDevice, ElectricityMixin, ConsumptionXMixin)):
+        platforms.add(HA_SENSOR)
+    if isinstance(device, (Mts100v3Valve, ThermostatModeMixin, ThermostatModeBMixin)):
+        platforms.add(HA_CLIMATE)
+    if isinstance(device, (SprayMixin, DiffuserSprayMixin)):
+        platforms.add(HA_HUMIDIFIER)
+    return platforms
 
 
 def invoke_method_or_property(obj, method_or_property):
@@ -145,15 +308,3 @@ def invoke_method_or_property(obj, method_or_property):
         return attr()
     else:
         return attr
-
-
-def extract_subdevice_notification_data(
-        data: dict, filter_accessor: str, subdevice_id: str
-) -> Dict:
-    # Operate only on relative accessor
-    context = data.get(filter_accessor)
-
-    for notification in context:
-        if notification.get("id") != subdevice_id:
-            continue
-        return notification
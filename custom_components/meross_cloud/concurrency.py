@@ -0,0 +1,167 @@
+"""Concurrency primitives bounding, ordering and pacing the commands sent to the devices.
+
+This module only depends on the standard library, so that the primitives can be tested on their own.
+"""
+import asyncio
+import functools
+import heapq
+import itertools
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from enum import IntEnum
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Iterator, List, Optional, Tuple
+
+if TYPE_CHECKING:
+    from .metrics import IntegrationMetrics
+
+class CommandPriority(IntEnum):
+    """Priority of a command: lower values are sent first"""
+    USER = 0
+    POLL = 1
+
+
+_command_priority: ContextVar[CommandPriority] = ContextVar("meross_command_priority", default=CommandPriority.USER)
+
+
+@contextmanager
+def polling_priority() -> Iterator[None]:
+    """Marks the commands issued within the block (and the tasks it spawns) as polling requests"""
+    token = _command_priority.set(CommandPriority.POLL)
+    try:
+        yield
+    finally:
+        _command_priority.reset(token)
+
+
+def polling(func: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+    """Decorates a coroutine function so that the commands it issues are sent as polling requests"""
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        with polling_priority():
+            return await func(*args, **kwargs)
+
+    return wrapper
+
+
+class PrioritySlots:
+    """
+    Bounds the number of holders of a resource. Callers exceeding the bound wait in a queue and are handed the
+    freed slots by priority, then in arrival order.
+    """
+
+    def __init__(self, max_in_flight: int):
+        self._max_in_flight = max_in_flight
+        self._in_flight = 0
+        self._waiters: List[Tuple[CommandPriority, int, asyncio.Future]] = []
+        self._counter = itertools.count()
+
+    @property
+    def max_in_flight(self) -> int:
+        return self._max_in_flight
+
+    @max_in_flight.setter
+    def max_in_flight(self, value: int) -> None:
+        self._max_in_flight = value
+        # A raised bound lets the queued callers in right away
+        while self._in_flight < self._max_in_flight and self._wake_next():
+            self._in_flight += 1
+
+    async def async_acquire(self, priority: CommandPriority) -> bool:
+        """Waits for a free slot, returning whether the caller had to be queued"""
+        if self._in_flight < self._max_in_flight and len(self._waiters) == 0:
+            self._in_flight += 1
+            return False
+
+        waiter = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._counter), waiter))
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            # The slot might have been handed over right before the cancellation: pass it on
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+        return True
+
+    def release(self) -> None:
+        # The slot goes straight to the next waiter, if any, unless the bound got lowered in the meantime
+        if self._in_flight > self._max_in_flight or not self._wake_next():
+            self._in_flight -= 1
+
+    def _wake_next(self) -> bool:
+        while len(self._waiters) > 0:
+            _, _, waiter = heapq.heappop(self._waiters)
+            if not waiter.done():
+                waiter.set_result(None)
+                return True
+        return False
+
+
+class DeviceCommandScheduler:
+    """
+    Serializes the commands sent to a device, so that the device handles one of them at a time, and bounds
+    the commands in flight across all the devices through the shared global slots. Waiting commands are released
+    by priority, then in arrival order, so that user commands overtake queued polls.
+    """
+
+    def __init__(self,
+                 name: str,
+                 global_slots: PrioritySlots,
+                 max_in_flight: int = 1,
+                 metrics: Optional['IntegrationMetrics'] = None):
+        self._name = name
+        self._metrics = metrics
+        self._device_slots = PrioritySlots(max_in_flight)
+        self._global_slots = global_slots
+
+    async def async_execute(self, send: Callable[[], Awaitable[Any]], priority: CommandPriority) -> Any:
+        """Sends the command once a slot is available, returning its response"""
+        if self._metrics is None:
+            return await self._async_run(send, priority)
+        with self._metrics.measure(f"command.{priority.name.lower()}"):
+            return await self._async_run(send, priority)
+
+    async def _async_run(self, send: Callable[[], Awaitable[Any]], priority: CommandPriority) -> Any:
+        # The device slot comes first, so that commands queued behind a busy device do not hold global slots
+        delayed = await self._device_slots.async_acquire(priority)
+        try:
+            delayed = await self._global_slots.async_acquire(priority) or delayed
+        except asyncio.CancelledError:
+            self._device_slots.release()
+            raise
+        if self._metrics is not None:
+            self._metrics.record_api_call(delayed=delayed)
+        try:
+            return await send()
+        finally:
+            self._global_slots.release()
+            self._device_slots.release()
+
+
+class RateLimiter:
+    """
+    Paces the callers so that they go through at most `rate` times per second, evenly spaced: bursts are
+    turned into a steady flow rather than being sent in a row and then waiting for the next second.
+    """
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self._next_slot = 0.0
+
+    async def async_acquire(self) -> bool:
+        """Waits for the next free slot, returning whether the caller had to wait"""
+        now = time.monotonic()
+        slot = max(now, self._next_slot)
+        self._next_slot = slot + 1 / self.rate
+        if slot <= now:
+            return False
+        try:
+            await asyncio.sleep(slot - now)
+        except asyncio.CancelledError:
+            # Give the slot back, unless a later caller already queued behind it
+            if self._next_slot == slot + 1 / self.rate:
+                self._next_slot = slot
+            raise
+        return True
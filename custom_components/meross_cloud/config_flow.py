@@ -1,6 +1,6 @@
 import asyncio
 import logging
-from typing import Dict, Any, Optional, List, Tuple
+from typing import Dict, Any, Optional, List, Set, Tuple
 from urllib.error import HTTPError
 
 import voluptuous as vol
@@ -28,7 +28,10 @@ from .common import DOMAIN, CONF_STORED_CREDS, CONF_WORKING_MODE, CONF_WORKING_M
     MEROSS_LOCAL_MDNS_API_SERVICE_TYPE, CONF_OVERRIDE_MQTT_ENDPOINT, MULTIPLE_APIS_FOUND, MULTIPLE_BROKERS_FOUND, \
     UNKNOWN_ERROR, \
     DIFFERENT_HOSTS_FOR_BROKER_AND_API, MEROSS_LOCAL_MQTT_BROKER_URI, CONF_OPT_LAN, CONF_OPT_LAN_MQTT_ONLY, \
-    CONF_OPT_LAN_HTTP_FIRST, CONF_OPT_LAN_HTTP_FIRST_ONLY_GET, DEFAULT_USER_AGENT
+    CONF_OPT_LAN_HTTP_FIRST, CONF_OPT_LAN_HTTP_FIRST_ONLY_GET, DEFAULT_USER_AGENT, \
+    CONF_OPT_CONSUMPTION_UPDATE_INTERVAL, CONSUMPTION_UPDATE_INTERVAL, MDNS_DISCOVERY_TIMEOUT_SECONDS, \
+    MDNS_DISCOVERY_GRACE_SECONDS, MDNS_RESOLVE_TIMEOUT_MS, CONF_OPT_FULL_REFRESH_WINDOW, FULL_REFRESH_WINDOW, \
+    CONF_OPT_POLL_RATE_LIMIT, POLL_RATE_LIMIT, CONF_OPT_MAX_CONCURRENT_COMMANDS, MAX_CONCURRENT_COMMANDS
 
 _LOGGER = logging.getLogger(__name__)
 PARALLEL_UPDATES = 1
@@ -59,6 +62,8 @@ class MerossFlowHandler(config_entries.ConfigFlow, domain=DOMAIN):
         self._local_mode: bool = False
         self._skip_cert_validation: Optional[bool] = None
         self._discovered_services: List[AsyncServiceInfo] = []
+        self._resolve_tasks: Set[asyncio.Task] = set()
+        self._services_found = asyncio.Event()
 
     def _build_setup_schema(
             self,
@@ -110,33 +115,54 @@ class MerossFlowHandler(config_entries.ConfigFlow, domain=DOMAIN):
     async def _resolve_service(self, zeroconf: Zeroconf, service_type: str, name: str):
         _LOGGER.debug("MDNS resolving service type: %s, name: %s", service_type, name)
         info = AsyncServiceInfo(service_type, name)
-        await info.async_request(zeroconf, 3000)
-        if info:
-            self._discovered_services.append(info)
+        # Answers already in the shared zeroconf cache spare us another round of queries on the network
+        if not info.load_from_cache(zeroconf) and not await info.async_request(zeroconf, MDNS_RESOLVE_TIMEOUT_MS):
+            _LOGGER.debug("MDNS could not resolve service type: %s, name: %s", service_type, name)
+            return
+        self._discovered_services.append(info)
+
+        # Discovery can stop as soon as an API and a MQTT service are known on the same host
+        api_hosts = {i.server for i in self._discovered_services if i.type == MEROSS_LOCAL_MDNS_API_SERVICE_TYPE}
+        mqtt_hosts = {i.server for i in self._discovered_services if i.type == MEROSS_LOCAL_MDNS_MQTT_SERVICE_TYPE}
+        if len(api_hosts & mqtt_hosts) > 0:
+            self._services_found.set()
 
     def _async_on_service_state_change(self, zeroconf: Zeroconf, service_type: str, name: str,
                                        state_change: ServiceStateChange) -> None:
         _LOGGER.debug("MDNS discovery state: %s, service type: %s, name: %s", str(state_change), service_type, name)
         if state_change is not ServiceStateChange.Added:
             return
-        # Resolve the service on a different async task
-        asyncio.ensure_future(self._resolve_service(zeroconf, service_type, name))
+        # Resolve the service on a different async task, tracked so that discovery can wait for it
+        task = self.hass.async_create_task(self._resolve_service(zeroconf, service_type, name))
+        self._resolve_tasks.add(task)
 
     async def _discover_services(self) -> Tuple[Optional[str], Optional[str]]:
         self._discovered_services.clear()
+        self._services_found.clear()
         aiozc = await zeroconf.async_get_async_instance(self.hass)
         browser = AsyncServiceBrowser(aiozc.zeroconf, MEROSS_LOCAL_MDNS_SERVICE_TYPES,
                                       handlers=[self._async_on_service_state_change])
-        # Wait a bit to collect MDNS responses and then stop the browser
-        await asyncio.sleep(5)
-        await browser.async_cancel()
+        try:
+            await asyncio.wait_for(self._services_found.wait(), MDNS_DISCOVERY_TIMEOUT_SECONDS)
+            # Leave a chance to other instances to answer, so that ambiguous setups are still reported
+            await asyncio.sleep(MDNS_DISCOVERY_GRACE_SECONDS)
+        except asyncio.TimeoutError:
+            _LOGGER.debug("MDNS discovery timed out")
+        finally:
+            await browser.async_cancel()
+            # Resolutions still running at this point are not going to make it
+            for task in self._resolve_tasks:
+                task.cancel()
+            await asyncio.gather(*self._resolve_tasks, return_exceptions=True)
+            self._resolve_tasks.clear()
+
         api_endpoint_info = None
         mqtt_endpoint_info = None
 
         mqtt_count = 0
         api_count = 0
         _LOGGER.info("Found %d mdns services.", len(self._discovered_services))
-        for info in self._discovered_services:
+        for info in sorted(self._discovered_services, key=lambda i: (i.type, i.name)):
             if info.type == MEROSS_LOCAL_MDNS_API_SERVICE_TYPE:
                 api_count += 1
                 api_endpoint_info = info
@@ -431,6 +457,21 @@ class MerossOptionsFlowHandler(config_entries.OptionsFlow):
                             {"value": CONF_OPT_LAN_HTTP_FIRST_ONLY_GET,
                              "label": "Attempt local HTTP communication first only for GET commands, fall-back to MQTT broker"}
                         ], mode=SelectSelectorMode.LIST)
-                )
+                ),
+                vol.Optional(CONF_OPT_CONSUMPTION_UPDATE_INTERVAL,
+                             default=saved_options.get(CONF_OPT_CONSUMPTION_UPDATE_INTERVAL,
+                                                       CONSUMPTION_UPDATE_INTERVAL)): vol.All(vol.Coerce(int),
+                                                                                              vol.Range(min=60)),
+                vol.Optional(CONF_OPT_FULL_REFRESH_WINDOW,
+                             default=saved_options.get(CONF_OPT_FULL_REFRESH_WINDOW,
+                                                       FULL_REFRESH_WINDOW)): vol.All(vol.Coerce(int),
+                                                                                      vol.Range(min=0)),
+                vol.Optional(CONF_OPT_POLL_RATE_LIMIT,
+                             default=saved_options.get(CONF_OPT_POLL_RATE_LIMIT,
+                                                       POLL_RATE_LIMIT)): vol.All(vol.Coerce(int), vol.Range(min=1)),
+                vol.Optional(CONF_OPT_MAX_CONCURRENT_COMMANDS,
+                             default=saved_options.get(CONF_OPT_MAX_CONCURRENT_COMMANDS,
+                                                       MAX_CONCURRENT_COMMANDS)): vol.All(vol.Coerce(int),
+                                                                                          vol.Range(min=1))
             })
         )
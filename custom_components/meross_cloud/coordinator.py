@@ -0,0 +1,578 @@
+"""Per-device data coordinators shared among the entities of the same Meross device"""
+import asyncio
+import itertools
+import logging
+import time
+from datetime import datetime, timedelta, date
+from typing import Any, Dict, Iterable, Optional, List, Tuple, TypeVar
+
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.debounce import Debouncer
+from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
+from meross_iot.controller.device import BaseDevice, GenericSubDevice, HubDevice
+from meross_iot.controller.mixins.consumption import ConsumptionXMixin
+from meross_iot.controller.mixins.dnd import SystemDndMixin
+from meross_iot.controller.mixins.electricity import ElectricityMixin
+from meross_iot.controller.subdevice import Ms100Sensor, Mts100v3Valve
+from meross_iot.manager import MerossManager
+from meross_iot.model.enums import DNDMode, OnlineStatus, Namespace
+from meross_iot.model.exception import CommandTimeoutError
+from meross_iot.model.plugin.hub import BatteryInfo
+from meross_iot.model.plugin.power import PowerInfo
+
+from .common import (DOMAIN, MANAGER, ELECTRICITY_SAMPLERS, CONSUMPTION_CACHES, HUB_POLLERS, DND_MODE_COORDINATORS,
+                     DEVICE_LIST_COORDINATOR, DEVICE_REFRESHERS, BATTERY_STORE, POLL_PHASES, ERRORS,
+                     CONF_OPT_FULL_REFRESH_WINDOW, FULL_REFRESH_WINDOW, HA_SENSOR_POLL_INTERVAL_SECONDS,
+                     REFRESH_REQUEST_COOLDOWN_SECONDS, POLL_STARTUP_SPREAD_SECONDS,
+                     CONF_OPT_CONSUMPTION_UPDATE_INTERVAL, CONSUMPTION_UPDATE_INTERVAL, DND_MODE_UPDATE_INTERVAL,
+                     ErrorRecorder)
+from .battery import BatteryStore
+from .health import DeviceBackoffError
+from .push import get_push_router
+from .concurrency import polling
+
+_LOGGER = logging.getLogger(__name__)
+
+GOLDEN_RATIO_CONJUGATE = 0.6180339887498949
+
+_DataT = TypeVar("_DataT")
+
+
+def device_channels(device: BaseDevice) -> List[int]:
+    """Returns the channel indexes exposed by the given device, defaulting to the main channel only"""
+    return [c.index for c in device.channels] if len(device.channels) > 0 else [0]
+
+
+def _as_list(payload: Any) -> List[dict]:
+    """Push payloads carry either a single element or a list of elements"""
+    if payload is None:
+        return []
+    return payload if isinstance(payload, list) else [payload]
+
+
+class PushCoverage:
+    """
+    Keeps track of the last time a push notification brought fresh data for a given (namespace, target) pair,
+    where the target is either a channel or a subdevice id. Pollers use it to skip the data that the device
+    is already pushing, and resume polling once pushes go quiet.
+    """
+
+    def __init__(self):
+        self._last_push: Dict[Tuple[Namespace, Any], float] = {}
+
+    def record(self, namespace: Namespace, target: Any) -> None:
+        self._last_push[(namespace, target)] = time.monotonic()
+
+    def is_fresh(self, namespace: Namespace, target: Any, window: timedelta) -> bool:
+        last_push = self._last_push.get((namespace, target))
+        return last_push is not None and time.monotonic() - last_push < window.total_seconds()
+
+    def stale(self, namespace: Namespace, targets: Iterable[Any], window: timedelta) -> List[Any]:
+        """Returns the targets that did not receive any push within the given window"""
+        return [t for t in targets if not self.is_fresh(namespace, t, window)]
+
+
+class PollPhaseAllocator:
+    """
+    Hands out the poll phases of the device coordinators, as fractions of their update interval. Phases follow
+    the golden ratio sequence, which keeps them evenly spread however many coordinators get created.
+    """
+
+    def __init__(self):
+        self._counter = itertools.count()
+
+    def next_phase(self) -> float:
+        return (next(self._counter) * GOLDEN_RATIO_CONJUGATE) % 1
+
+
+class PhasedCoordinator(DataUpdateCoordinator[_DataT]):
+    """
+    Coordinator whose periodic refreshes are shifted to a phase slot of the update interval, so that the
+    coordinators created at the same time (e.g. at startup) do not poll their devices in the same second.
+    The first refresh is delayed by the phase as well, over a window capped to a few seconds so that long
+    intervals do not leave the entities without data for too long. The second refresh is then scheduled at
+    the assigned phase, and the following ones keep it. Update failures other than timeouts (already tracked by
+    the device health) are recorded against the polled device.
+    """
+
+    def __init__(self, hass: HomeAssistant, device: BaseDevice, **kwargs):
+        super().__init__(hass=hass, **kwargs)
+        self._device = device
+        self._errors: ErrorRecorder = hass.data[DOMAIN][ERRORS]
+        self._phase: Optional[float] = hass.data[DOMAIN][POLL_PHASES].next_phase()
+        self._startup_offset: Optional[float] = None
+        self._phased_interval: Optional[timedelta] = None
+        self._nominal_interval: Optional[timedelta] = None
+
+    async def _async_update_data(self) -> _DataT:
+        self._async_restore_interval()
+        if self._phase is not None and self._startup_offset is None and self.update_interval is not None:
+            self._startup_offset = self._phase * min(self.update_interval.total_seconds(),
+                                                     POLL_STARTUP_SPREAD_SECONDS)
+            await asyncio.sleep(self._startup_offset)
+        try:
+            data = await super()._async_update_data()
+        except CommandTimeoutError:
+            raise
+        except Exception as e:
+            self._errors.record(logger=_LOGGER, message=f"Update of {self.name} failed: {e}", device=self._device)
+            raise UpdateFailed(f"Update of {self.name} failed: {e}") from e
+        self._async_shift_phase()
+        return data
+
+    @callback
+    def _async_shift_phase(self) -> None:
+        if self._phase is None or self.update_interval is None:
+            return
+        # The next refresh gets scheduled right after this one, with the interval set here. The first refresh
+        # already got delayed by the startup offset, so only the rest of the phase is left to catch up.
+        interval = self.update_interval.total_seconds()
+        delay = (self._phase * interval - (self._startup_offset or 0.0)) % interval
+        self._nominal_interval = self.update_interval
+        self._phased_interval = timedelta(seconds=delay if delay >= 1.0 else delay + interval)
+        self._phase = None
+        self.update_interval = self._phased_interval
+
+    @callback
+    def _async_restore_interval(self) -> None:
+        if self._phased_interval is None:
+            return
+        # Back to the nominal interval, unless it got changed in the meantime (e.g. by an options update)
+        if self.update_interval == self._phased_interval:
+            self.update_interval = self._nominal_interval
+        self._phased_interval = None
+
+
+class ElectricitySampler(PhasedCoordinator[Dict[int, PowerInfo]]):
+    """
+    Samples the instant electricity metrics of every channel of a device once per update interval,
+    so that all the entities reading the same channel (power, current, voltage sensors and switches)
+    share a single device round-trip.
+    """
+
+    def __init__(self, hass: HomeAssistant, device: ElectricityMixin, update_interval: timedelta):
+        # Refresh requests issued by sibling entities at the same time (e.g. when they are added to HA)
+        # are collapsed into a single sampling.
+        debouncer = Debouncer(hass, _LOGGER, cooldown=REFRESH_REQUEST_COOLDOWN_SECONDS, immediate=False)
+        super().__init__(hass=hass, device=device, logger=_LOGGER, name=f"meross_electricity_sampler_{device.uuid}",
+                         update_interval=update_interval, update_method=self._async_sample,
+                         request_refresh_debouncer=debouncer)
+
+        # Devices pushing their metrics are not polled for them
+        self._coverage = PushCoverage()
+        device.register_push_notification_handler_coroutine(self._async_push_notification_received)
+
+    async def _async_push_notification_received(self, namespace: Namespace, data: dict, device_internal_id: str):
+        if namespace != Namespace.CONTROL_ELECTRICITY:
+            return
+        samples = dict(self.data) if self.data is not None else {}
+        for metrics in _as_list(data.get('electricity')):
+            try:
+                channel = metrics.get('channel', 0)
+                sample = PowerInfo(current_ampere=float(metrics['current']) / 1000,
+                                   voltage_volts=float(metrics['voltage']) / 10,
+                                   power_watts=float(metrics['power']) / 1000,
+                                   sample_timestamp=datetime.utcnow())
+            except (AttributeError, KeyError, TypeError, ValueError):
+                # Incomplete entries are left to the polling, which keeps sampling the channel
+                _LOGGER.debug("Skipping incomplete electricity push from device %s: %s", self._device.name, metrics)
+                continue
+            samples[channel] = sample
+            self._coverage.record(namespace, channel)
+        self.async_set_updated_data(samples)
+
+    async def async_shutdown(self) -> None:
+        self._device.unregister_push_notification_handler_coroutine(self._async_push_notification_received)
+        await super().async_shutdown()
+
+    @polling
+    async def _async_sample(self) -> Dict[int, PowerInfo]:
+        # Keep serving the last known samples when the device is not reachable
+        samples = dict(self.data) if self.data is not None else {}
+        if self._device.online_status != OnlineStatus.ONLINE:
+            return samples
+
+        for channel in self._coverage.stale(Namespace.CONTROL_ELECTRICITY, device_channels(self._device),
+                                            self.update_interval):
+            try:
+                _LOGGER.debug("Sampling instant metrics for device %s, channel %d", self._device.name, channel)
+                samples[channel] = await self._device.async_get_instant_metrics(channel=channel)
+            except DeviceBackoffError:
+                break
+            except CommandTimeoutError as e:
+                _LOGGER.debug("Sampling of device %s, channel %d timed out: %s", self._device.name, channel, e.message)
+        return samples
+
+    def get_sample(self, channel: int) -> Optional[PowerInfo]:
+        """Returns the latest sample collected for the given channel, if any"""
+        if self.data is None:
+            return None
+        return self.data.get(channel)
+
+
+def get_electricity_sampler(hass: HomeAssistant, device: ElectricityMixin) -> ElectricitySampler:
+    """Returns the electricity sampler bound to the given device, creating it when needed"""
+    samplers: Dict[str, ElectricitySampler] = hass.data[DOMAIN][ELECTRICITY_SAMPLERS]
+    sampler = samplers.get(device.internal_id)
+    if sampler is None:
+        sampler = ElectricitySampler(hass=hass, device=device,
+                                     update_interval=timedelta(seconds=HA_SENSOR_POLL_INTERVAL_SECONDS))
+        samplers[device.internal_id] = sampler
+    return sampler
+
+
+class ConsumptionCache(PhasedCoordinator[Dict[Tuple[int, date], float]]):
+    """
+    Caches the daily consumption history of every channel of a device. The history is downloaded once for all
+    the channels and refreshed on a slow cadence, as it only changes a few times per hour. Data is indexed
+    by (channel, date) so that entities can look up their value without scanning the whole history.
+    """
+
+    def __init__(self, hass: HomeAssistant, device: ConsumptionXMixin, update_interval: timedelta):
+        debouncer = Debouncer(hass, _LOGGER, cooldown=REFRESH_REQUEST_COOLDOWN_SECONDS, immediate=False)
+        super().__init__(hass=hass, device=device, logger=_LOGGER, name=f"meross_consumption_cache_{device.uuid}",
+                         update_interval=update_interval, update_method=self._async_fetch_consumption,
+                         request_refresh_debouncer=debouncer)
+
+    @polling
+    async def _async_fetch_consumption(self) -> Dict[Tuple[int, date], float]:
+        index = dict(self.data) if self.data is not None else {}
+        if self._device.online_status != OnlineStatus.ONLINE:
+            return index
+
+        for channel in device_channels(self._device):
+            try:
+                _LOGGER.debug("Fetching consumption history for device %s, channel %d", self._device.name, channel)
+                history = await self._device.async_get_daily_power_consumption(channel=channel)
+            except DeviceBackoffError:
+                break
+            except CommandTimeoutError as e:
+                _LOGGER.debug("Consumption fetch of device %s, channel %d timed out: %s", self._device.name, channel,
+                              e.message)
+                continue
+            for x in history:
+                index[(channel, x['date'].date())] = x['total_consumption_kwh']
+        return index
+
+    def get_daily_consumption(self, channel: int, day: date) -> Optional[float]:
+        """Returns the energy consumed (kWh) by the given channel on the given day, if known"""
+        if self.data is None:
+            return None
+        return self.data.get((channel, day))
+
+
+def get_consumption_update_interval(config_entry: ConfigEntry) -> timedelta:
+    """Returns the consumption history refresh interval configured for the given entry"""
+    return timedelta(seconds=config_entry.options.get(CONF_OPT_CONSUMPTION_UPDATE_INTERVAL,
+                                                      CONSUMPTION_UPDATE_INTERVAL))
+
+
+def get_consumption_cache(hass: HomeAssistant, device: ConsumptionXMixin,
+                          update_interval: timedelta) -> ConsumptionCache:
+    """Returns the consumption cache bound to the given device, creating it when needed"""
+    caches: Dict[str, ConsumptionCache] = hass.data[DOMAIN][CONSUMPTION_CACHES]
+    cache = caches.get(device.internal_id)
+    if cache is None:
+        cache = ConsumptionCache(hass=hass, device=device, update_interval=update_interval)
+        caches[device.internal_id] = cache
+    return cache
+
+
+class DndModeCoordinator(PhasedCoordinator[Optional[DNDMode]]):
+    """
+    Reads the do-not-disturb mode of a device on a slow cadence. The mode is not part of the full device state
+    and its changes are never pushed, so it gets its own request, shared by the entities of the device.
+    """
+
+    def __init__(self, hass: HomeAssistant, device: SystemDndMixin, update_interval: timedelta):
+        debouncer = Debouncer(hass, _LOGGER, cooldown=REFRESH_REQUEST_COOLDOWN_SECONDS, immediate=False)
+        super().__init__(hass=hass, device=device, logger=_LOGGER, name=f"meross_dnd_mode_{device.uuid}",
+                         update_interval=update_interval, update_method=self._async_fetch_dnd_mode,
+                         request_refresh_debouncer=debouncer)
+
+    @polling
+    async def _async_fetch_dnd_mode(self) -> Optional[DNDMode]:
+        if self._device.online_status != OnlineStatus.ONLINE:
+            return self.data
+        try:
+            return await self._device.async_get_dnd_mode()
+        except CommandTimeoutError as e:
+            _LOGGER.debug("DND mode fetch of device %s timed out: %s", self._device.name, e.message)
+            return self.data
+
+
+def get_dnd_mode_coordinator(hass: HomeAssistant, device: SystemDndMixin) -> DndModeCoordinator:
+    """Returns the do-not-disturb mode coordinator bound to the given device, creating it when needed"""
+    coordinators: Dict[str, DndModeCoordinator] = hass.data[DOMAIN][DND_MODE_COORDINATORS]
+    coordinator = coordinators.get(device.internal_id)
+    if coordinator is None:
+        coordinator = DndModeCoordinator(hass=hass, device=device,
+                                         update_interval=timedelta(seconds=DND_MODE_UPDATE_INTERVAL))
+        coordinators[device.internal_id] = coordinator
+    return coordinator
+
+
+# Key holding the subdevice notifications within the hub pushes the poller cares about
+_HUB_PUSH_ACCESSORS = {
+    Namespace.HUB_MTS100_ALL: 'all',
+    Namespace.HUB_MTS100_TEMPERATURE: 'temperature',
+    Namespace.HUB_SENSOR_ALL: 'all',
+    Namespace.HUB_SENSOR_TEMPHUM: 'tempHum',
+    Namespace.HUB_ONLINE: 'online',
+    Namespace.HUB_BATTERY: 'battery',
+}
+
+
+class HubSubdevicePoller(PhasedCoordinator[Dict[str, BatteryInfo]]):
+    """
+    Polls the online state, the valve temperatures, the sensor readings and the battery level of all the
+    subdevices of a hub with a single request per namespace, rather than one request per subdevice. Temperature,
+    sensor readings and online state are dispatched to the subdevices as notifications, while battery levels
+    are kept as coordinator data, indexed by subdevice id. Batteries are only polled when due as per the battery
+    store schedule.
+    """
+
+    def __init__(self, hass: HomeAssistant, hub: HubDevice, battery_store: BatteryStore, update_interval: timedelta):
+        # The hub does not expose any public way of querying several subdevices with a single command, so the
+        # batched requests go through its command method directly.
+        self._hub = hub
+        self._battery_store = battery_store
+        # Last online status seen for every subdevice, used to detect the ones coming back online
+        self._online_status: Dict[str, int] = {}
+        debouncer = Debouncer(hass, _LOGGER, cooldown=REFRESH_REQUEST_COOLDOWN_SECONDS, immediate=False)
+        super().__init__(hass=hass, device=hub, logger=_LOGGER, name=f"meross_hub_poller_{hub.uuid}",
+                         update_interval=update_interval, update_method=self._async_poll,
+                         request_refresh_debouncer=debouncer)
+
+        # Subdevices whose state has just been pushed by the hub are left out of the next poll
+        self._coverage = PushCoverage()
+        hub.register_push_notification_handler_coroutine(self._async_push_notification_received)
+
+    async def _async_push_notification_received(self, namespace: Namespace, data: dict, device_internal_id: str):
+        accessor = _HUB_PUSH_ACCESSORS.get(namespace)
+        if accessor is None:
+            return
+        # Hub pushes carry the notifications of several subdevices at once
+        notifications = {n.get('id'): n for n in _as_list(data.get(accessor))}
+
+        if namespace == Namespace.HUB_MTS100_ALL:
+            for subdevice_id in notifications:
+                self._coverage.record(Namespace.HUB_MTS100_TEMPERATURE, subdevice_id)
+                self._coverage.record(Namespace.HUB_ONLINE, subdevice_id)
+        elif namespace == Namespace.HUB_MTS100_TEMPERATURE:
+            for subdevice_id in notifications:
+                self._coverage.record(namespace, subdevice_id)
+        elif namespace in (Namespace.HUB_SENSOR_ALL, Namespace.HUB_SENSOR_TEMPHUM):
+            for subdevice_id in notifications:
+                self._coverage.record(Namespace.HUB_SENSOR_ALL, subdevice_id)
+        elif namespace == Namespace.HUB_ONLINE:
+            back_online = False
+            for subdevice_id, state in notifications.items():
+                self._coverage.record(namespace, subdevice_id)
+                back_online |= self._track_online_status(subdevice_id, state.get('status'))
+            if back_online:
+                await self.async_request_refresh()
+        elif namespace == Namespace.HUB_BATTERY:
+            batteries = dict(self.data) if self.data is not None else {}
+            for subdevice_id, b in notifications.items():
+                # Entries without a reading must neither be stored nor push back the next scheduled poll
+                if b.get('value') is None:
+                    continue
+                batteries[subdevice_id] = self._battery_store.async_record(subdevice_id, b.get('value'))
+            self.async_set_updated_data(batteries)
+
+    async def async_shutdown(self) -> None:
+        self._hub.unregister_push_notification_handler_coroutine(self._async_push_notification_received)
+        await super().async_shutdown()
+
+    def _track_online_status(self, subdevice_id: str, status: Optional[int]) -> bool:
+        """Records the online status of a subdevice and, when it came back online, makes its battery due"""
+        previous = self._online_status.get(subdevice_id)
+        self._online_status[subdevice_id] = status
+        if previous is not None and previous != OnlineStatus.ONLINE.value and status == OnlineStatus.ONLINE.value:
+            self._battery_store.async_request_refresh(subdevice_id)
+            return True
+        return False
+
+    @polling
+    async def _async_poll(self) -> Dict[str, BatteryInfo]:
+        batteries = dict(self.data) if self.data is not None else {}
+        subdevices = list(self._hub.get_subdevices())
+        if self._hub.online_status != OnlineStatus.ONLINE or len(subdevices) == 0:
+            return batteries
+
+        def _stale(namespace: Namespace, candidates: List[GenericSubDevice]) -> List[GenericSubDevice]:
+            return [s for s in candidates if not self._coverage.is_fresh(namespace, s.subdevice_id,
+                                                                         self.update_interval)]
+
+        try:
+            to_poll = _stale(Namespace.HUB_ONLINE, subdevices)
+            if Namespace.HUB_ONLINE.value in self._hub.abilities and len(to_poll) > 0:
+                await self._async_poll_online(to_poll)
+            to_poll = _stale(Namespace.HUB_MTS100_TEMPERATURE, [s for s in subdevices if isinstance(s, Mts100v3Valve)])
+            if len(to_poll) > 0:
+                await self._async_poll_temperature(to_poll)
+            to_poll = _stale(Namespace.HUB_SENSOR_ALL, [s for s in subdevices if isinstance(s, Ms100Sensor)])
+            if len(to_poll) > 0:
+                await self._async_poll_sensors(to_poll)
+            to_poll = [s for s in subdevices if self._battery_store.is_due(s.subdevice_id)]
+            if len(to_poll) > 0:
+                batteries.update(await self._async_poll_battery(to_poll))
+        except CommandTimeoutError as e:
+            _LOGGER.debug("Polling of hub %s timed out: %s", self._hub.name, e.message)
+        return batteries
+
+    async def _async_poll_online(self, subdevices: List[GenericSubDevice]) -> None:
+        by_id = {s.subdevice_id: s for s in subdevices}
+        result = await self._hub._execute_command(method="GET", namespace=Namespace.HUB_ONLINE,
+                                                  payload={"online": [{"id": i} for i in by_id]})
+        for state in result.get("online", []):
+            self._track_online_status(state.get("id"), state.get("status"))
+            subdevice = by_id.get(state.get("id"))
+            if subdevice is None or subdevice.online_status.value == state.get("status"):
+                continue
+            # Only changes are dispatched, as they make the subdevice entities refresh. Hub online events carry
+            # the status both flat (as read by the entities) and within "online" (as read by the subdevices).
+            data = dict(state, online={"status": state.get("status"), "lastActiveTime": state.get("lastActiveTime")})
+            await subdevice.async_handle_subdevice_notification(namespace=Namespace.HUB_ONLINE, data=data)
+
+    async def _async_poll_temperature(self, valves: List[Mts100v3Valve]) -> None:
+        by_id = {v.subdevice_id: v for v in valves}
+        result = await self._hub._execute_command(method="GET", namespace=Namespace.HUB_MTS100_TEMPERATURE,
+                                                  payload={"temperature": [{"id": i} for i in by_id]})
+        for state in result.get("temperature", []):
+            valve = by_id.get(state.get("id"))
+            if valve is not None:
+                await valve.async_handle_subdevice_notification(namespace=Namespace.HUB_MTS100_TEMPERATURE,
+                                                                data=state)
+
+    async def _async_poll_sensors(self, sensors: List[Ms100Sensor]) -> None:
+        by_id = {s.subdevice_id: s for s in sensors}
+        result = await self._hub._execute_command(method="GET", namespace=Namespace.HUB_SENSOR_ALL,
+                                                  payload={"all": [{"id": i} for i in by_id]})
+        for state in result.get("all", []):
+            sensor = by_id.get(state.get("id"))
+            if sensor is not None:
+                await sensor.async_handle_subdevice_notification(namespace=Namespace.HUB_SENSOR_ALL, data=state)
+
+    async def _async_poll_battery(self, subdevices: List[GenericSubDevice]) -> Dict[str, BatteryInfo]:
+        result = await self._hub._execute_command(method="GET", namespace=Namespace.HUB_BATTERY,
+                                                  payload={"battery": [{"id": s.subdevice_id} for s in subdevices]})
+        return {b.get("id"): self._battery_store.async_record(b.get("id"), b.get("value"))
+                for b in result.get("battery", []) if b.get("value") is not None}
+
+    def get_battery(self, subdevice_id: str) -> Optional[BatteryInfo]:
+        """Returns the latest battery info known for the given subdevice, including the stored one, if any"""
+        return self._battery_store.get(subdevice_id)
+
+
+def get_hub_poller(hass: HomeAssistant, subdevice: GenericSubDevice) -> Optional[HubSubdevicePoller]:
+    """
+    Returns the poller of the hub the given subdevice belongs to, creating it when needed. Returns None when
+    the hub is no more known to the manager (e.g. relinquished after the subdevice got reported).
+    """
+    pollers: Dict[str, HubSubdevicePoller] = hass.data[DOMAIN][HUB_POLLERS]
+    manager: MerossManager = hass.data[DOMAIN][MANAGER]
+    # Subdevices share the uuid of their hub
+    hubs = manager.find_devices(device_uuids=(subdevice.uuid,), device_class=HubDevice)
+    if len(hubs) == 0:
+        _LOGGER.debug("The hub of subdevice %s (%s) is gone, skipping it", subdevice.name, subdevice.subdevice_id)
+        return None
+    hub = hubs[0]
+    poller = pollers.get(hub.internal_id)
+    if poller is None:
+        poller = HubSubdevicePoller(hass=hass, hub=hub, battery_store=hass.data[DOMAIN][BATTERY_STORE],
+                                    update_interval=timedelta(seconds=HA_SENSOR_POLL_INTERVAL_SECONDS))
+        pollers[hub.internal_id] = poller
+    return poller
+
+
+class DeviceRefresher:
+    """
+    Shares the full state refresh (SYSTEM_ALL) of a device among its entities. A refresh completed within the
+    freshness window is reused and a refresh in progress is awaited rather than issued again. The window is
+    reset when the device comes back online, so that the refresh forced by that transition happens once per device.
+    """
+
+    def __init__(self, hass: HomeAssistant, device: BaseDevice, freshness_window: timedelta):
+        self._device = device
+        self.freshness_window = freshness_window
+        # Start time of the last successful refresh. The device own full update timestamp is not reliable here,
+        # as it is also set when the device gets restored from a snapshot.
+        self._last_refresh: Optional[float] = None
+        self._invalidated_at = 0.0
+        self._pending: Optional[asyncio.Future] = None
+        self._pending_started = 0.0
+
+        coordinator = hass.data[DOMAIN][DEVICE_LIST_COORDINATOR]
+        http_info = coordinator.data.get(device.uuid) if coordinator.data is not None else None
+        self._http_online = http_info.online_status if http_info is not None else None
+        self._coordinator = coordinator
+        self._cb_async_remove_push_listener = get_push_router(hass, device).async_subscribe(
+            self._async_push_notification_received, namespaces=())
+        self._cb_async_remove_http_listener = coordinator.async_add_device_http_listener(device.uuid,
+                                                                                         self._http_data_changed)
+
+    @callback
+    def close(self) -> None:
+        """Stops listening to the device updates, once the device is gone"""
+        self._cb_async_remove_push_listener()
+        self._cb_async_remove_http_listener()
+
+    def invalidate(self) -> None:
+        """Makes the next refresh go to the device, whatever the age of the last one"""
+        self._invalidated_at = time.monotonic()
+
+    async def async_refresh(self) -> None:
+        """Refreshes the full device state, unless a fresh enough refresh is available or in progress"""
+        if self._last_refresh is not None and self._last_refresh > self._invalidated_at and \
+                time.monotonic() - self._last_refresh < self.freshness_window.total_seconds():
+            return
+
+        if self._pending is None or self._pending_started <= self._invalidated_at:
+            self._pending_started = time.monotonic()
+            self._pending = asyncio.ensure_future(self._async_refresh(self._pending_started))
+            # Retrieve the outcome even when every entity gave up on it
+            self._pending.add_done_callback(lambda f: f.cancelled() or f.exception())
+        # Entities giving up must not cancel the refresh on behalf of their siblings
+        await asyncio.shield(self._pending)
+
+    async def _async_refresh(self, started: float) -> None:
+        try:
+            await self._device.async_update()
+            self._last_refresh = started
+        finally:
+            if self._pending_started == started:
+                self._pending = None
+
+    async def _async_push_notification_received(self, namespace: Namespace, data: dict, device_internal_id: str):
+        if namespace not in (Namespace.SYSTEM_ONLINE, Namespace.HUB_ONLINE):
+            return
+        # System online events nest the status, hub online events (as read by the entities) carry it flat
+        status = data.get('online', {}).get('status', data.get('status'))
+        if status is not None and OnlineStatus(int(status)) == OnlineStatus.ONLINE:
+            self.invalidate()
+
+    def _http_data_changed(self) -> None:
+        http_info = self._coordinator.data.get(self._device.uuid)
+        online = http_info.online_status if http_info is not None else None
+        if self._http_online is not None and self._http_online != OnlineStatus.ONLINE and \
+                online == OnlineStatus.ONLINE:
+            self.invalidate()
+        self._http_online = online
+
+
+def get_full_refresh_window(config_entry: ConfigEntry) -> timedelta:
+    """Returns the window within which a full device refresh is shared among sibling entities"""
+    return timedelta(seconds=config_entry.options.get(CONF_OPT_FULL_REFRESH_WINDOW, FULL_REFRESH_WINDOW))
+
+
+def get_device_refresher(hass: HomeAssistant, device: BaseDevice, freshness_window: timedelta) -> DeviceRefresher:
+    """Returns the full state refresher bound to the given device, creating it when needed"""
+    refreshers: Dict[str, DeviceRefresher] = hass.data[DOMAIN][DEVICE_REFRESHERS]
+    refresher = refreshers.get(device.internal_id)
+    if refresher is None:
+        refresher = DeviceRefresher(hass=hass, device=device, freshness_window=freshness_window)
+        refreshers[device.internal_id] = refresher
+    return refresher
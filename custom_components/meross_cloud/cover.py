@@ -1,6 +1,6 @@
 import logging
 from enum import Enum
-from typing import Any, Dict, Union
+from typing import Any, Dict, Union, List
 
 from homeassistant.core import HomeAssistant
 from meross_iot.controller.device import BaseDevice
@@ -20,9 +20,11 @@ from homeassistant.components.cover import (
 
 from homeassistant.helpers.update_coordinator import DataUpdateCoordinator
 from . import MerossDevice
+from .coalescer import CommandCoalescer
 from .common import (DOMAIN, MANAGER, HA_COVER, DEVICE_LIST_COORDINATOR)
 
 _LOGGER = logging.getLogger(__name__)
+PARALLEL_UPDATES = 0
 
 
 class MerossGarageDevice(GarageOpenerMixin, BaseDevice):
@@ -119,15 +121,27 @@ class RollerShutterEntityWrapper(MerossDevice, CoverEntity):
             channel=channel,
             device_list_coordinator=device_list_coordinator,
             platform=HA_COVER)
+        self._commands = CommandCoalescer(name=self.unique_id, send=self._async_send_cover_command)
 
     async def async_close_cover(self, **kwargs):
-        await self._device.async_close(channel=self._channel_id, skip_rate_limits=True)
+        await self._commands.async_submit(action="close", position=None)
 
     async def async_open_cover(self, **kwargs):
-        await self._device.async_open(channel=self._channel_id, skip_rate_limits=True)
+        await self._commands.async_submit(action="open", position=None)
 
     async def async_stop_cover(self, **kwargs):
-        await self._device.async_stop(channel=self._channel_id, skip_rate_limits=True)
+        await self._commands.async_submit(action="stop", position=None)
+
+    async def _async_send_cover_command(self, state: dict) -> None:
+        # Only the last requested movement is sent
+        if "position" in state:
+            await self._device.async_set_position(position=state["position"], channel=self._channel_id)
+        elif state.get("action") == "open":
+            await self._device.async_open(channel=self._channel_id, skip_rate_limits=True)
+        elif state.get("action") == "close":
+            await self._device.async_close(channel=self._channel_id, skip_rate_limits=True)
+        elif state.get("action") == "stop":
+            await self._device.async_stop(channel=self._channel_id, skip_rate_limits=True)
 
     def open_cover(self, **kwargs: Any) -> None:
         self.hass.async_add_executor_job(self.async_open_cover, **kwargs)
@@ -169,7 +183,7 @@ class RollerShutterEntityWrapper(MerossDevice, CoverEntity):
         return status == RollerShutterState.OPENING
 
     async def async_set_cover_position(self, position: int):
-        await self._device.async_set_position(position=position, channel=self._channel_id)
+        await self._commands.async_submit(position=position, action=None)
 
     def set_cover_position(self, **kwargs):
         position = round(kwargs.get(ATTR_POSITION) or 0)
@@ -177,13 +191,12 @@ class RollerShutterEntityWrapper(MerossDevice, CoverEntity):
 
 
 async def async_setup_entry(hass: HomeAssistant, config_entry, async_add_entities):
-    def entity_adder_callback():
-        """Discover and adds new Meross entities"""
-        manager: MerossManager = hass.data[DOMAIN][MANAGER]
+    def entity_adder_callback(devices: List[BaseDevice], removed: List[BaseDevice]):
+        """Adds the Meross entities of the newly discovered devices"""
         coordinator = hass.data[DOMAIN][DEVICE_LIST_COORDINATOR]
-        devices = manager.find_devices(device_class=[GarageOpenerMixin, RollerShutterTimerMixin])
         new_entities = []
-        for d in devices:
+        cover_devs = filter(lambda d: isinstance(d, (GarageOpenerMixin, RollerShutterTimerMixin)), devices)
+        for d in cover_devs:
             # For multi-channel garage doors opener (like MSG200), the main channel is not operable and
             # does not provide meaningful states. For this reason, we will ignore the "main channel"
             # of any cover device which has more than 1 channels. Of course, we will keep working with channel
@@ -205,10 +218,10 @@ async def async_setup_entry(hass: HomeAssistant, config_entry, async_add_entitie
 
         async_add_entities(new_entities, True)
 
+    # The coordinator immediately reports the devices it already knows and then only notifies the ones that
+    # get added or removed afterwards.
     coordinator = hass.data[DOMAIN][DEVICE_LIST_COORDINATOR]
-    coordinator.async_add_listener(entity_adder_callback)
-    # Run the entity adder a first time during setup
-    entity_adder_callback()
+    config_entry.async_on_unload(coordinator.async_add_device_set_listener(entity_adder_callback))
 
 
 # TODO: Implement entry unload
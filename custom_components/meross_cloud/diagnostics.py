@@ -0,0 +1,29 @@
+"""Diagnostics support for the Meross integration"""
+from typing import Any, Dict
+
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import CONF_PASSWORD, CONF_USERNAME
+from homeassistant.core import HomeAssistant
+
+from .common import DOMAIN, MANAGER, LOADED_PLATFORMS, CONF_STORED_CREDS, ERRORS
+from .metrics import get_metrics
+from .scheduler import SchedulingMerossManager
+
+TO_REDACT = {CONF_STORED_CREDS, CONF_USERNAME, CONF_PASSWORD}
+
+
+async def async_get_config_entry_diagnostics(hass: HomeAssistant, entry: ConfigEntry) -> Dict[str, Any]:
+    """Returns the diagnostics of the given config entry, including the hot path metrics"""
+    manager: SchedulingMerossManager = hass.data[DOMAIN][MANAGER]
+    return {
+        "entry": {
+            "data": async_redact_data(entry.data, TO_REDACT),
+            "options": dict(entry.options),
+        },
+        "devices": len(manager.find_devices()),
+        "loaded_platforms": sorted(hass.data[DOMAIN][LOADED_PLATFORMS]),
+        "metrics": get_metrics(hass).as_dict(),
+        "device_health": manager.device_health.as_dict(),
+        "errors": hass.data[DOMAIN][ERRORS].as_list(),
+    }
@@ -0,0 +1,138 @@
+"""Tracking of the devices responsiveness: adaptive command timeouts and circuit breaking of unresponsive devices"""
+import logging
+import math
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Optional
+
+from meross_iot.model.exception import CommandTimeoutError
+
+from .common import (COMMAND_TIMEOUT_MIN, COMMAND_TIMEOUT_RTT_FACTOR, COMMAND_RTT_SAMPLES,
+                     CIRCUIT_BREAKER_THRESHOLD, CIRCUIT_BREAKER_BACKOFF, CIRCUIT_BREAKER_MAX_BACKOFF,
+                     FAILURE_LOG_INTERVAL, ErrorRecorder)
+
+_LOGGER = logging.getLogger(__name__)
+
+# Round-trip samples needed before a timeout is derived from them
+MIN_RTT_SAMPLES = 5
+RTT_PERCENTILE = 0.95
+
+
+class DeviceBackoffError(CommandTimeoutError):
+    """Raised in place of sending a polling command to a device whose circuit is open"""
+
+
+class RoundTripStats:
+    """Keeps the most recent round-trip times and derives a timeout from their high percentile"""
+
+    def __init__(self, size: int = COMMAND_RTT_SAMPLES):
+        self._samples: Deque[float] = deque(maxlen=size)
+
+    def observe(self, rtt: float) -> None:
+        self._samples.append(rtt)
+
+    def percentile(self, percentile: float = RTT_PERCENTILE) -> Optional[float]:
+        if len(self._samples) < MIN_RTT_SAMPLES:
+            return None
+        samples = sorted(self._samples)
+        return samples[min(len(samples) - 1, math.ceil(len(samples) * percentile) - 1)]
+
+
+class DeviceHealth:
+    """
+    Responsiveness of a single device. After a few timeouts in a row its circuit opens: polls are skipped
+    for a backoff period that doubles at every further failure, up to a maximum. The first command that gets
+    an answer closes the circuit again. Timeouts are reported as a rate-limited counter, not one by one,
+    and counted by the error recorder, if any, along with the other errors of the device.
+    """
+
+    def __init__(self, uuid: str, name: str, type_stats: RoundTripStats, errors: Optional[ErrorRecorder] = None):
+        self.uuid = uuid
+        self.name = name
+        self._stats = RoundTripStats()
+        self._type_stats = type_stats
+        self._errors = errors
+        self.consecutive_failures = 0
+        self.total_failures = 0
+        self._unreported_failures = 0
+        self._last_report = 0.0
+        self._open_until = 0.0
+
+    def timeout(self, default: float) -> float:
+        """Timeout to use for the next command: a multiple of the observed round-trip percentile"""
+        rtt = self._stats.percentile()
+        if rtt is None:
+            # Not enough samples yet: rely on the devices of the same type
+            rtt = self._type_stats.percentile()
+        if rtt is None:
+            return default
+        return min(default, max(COMMAND_TIMEOUT_MIN, rtt * COMMAND_TIMEOUT_RTT_FACTOR))
+
+    def is_open(self) -> bool:
+        """Tells whether polls to the device should be skipped"""
+        return time.monotonic() < self._open_until
+
+    def record_success(self, rtt: float) -> None:
+        self._stats.observe(rtt)
+        self._type_stats.observe(rtt)
+        if self.consecutive_failures >= CIRCUIT_BREAKER_THRESHOLD:
+            _LOGGER.info("Device %s (%s) is answering again after %d timeouts in a row", self.name, self.uuid,
+                         self.consecutive_failures)
+        self.consecutive_failures = 0
+        self._open_until = 0.0
+
+    def record_failure(self) -> None:
+        now = time.monotonic()
+        self.consecutive_failures += 1
+        self.total_failures += 1
+        self._unreported_failures += 1
+        backoff = 0
+        if self.consecutive_failures >= CIRCUIT_BREAKER_THRESHOLD:
+            exponent = min(self.consecutive_failures - CIRCUIT_BREAKER_THRESHOLD, 16)
+            backoff = min(CIRCUIT_BREAKER_MAX_BACKOFF, CIRCUIT_BREAKER_BACKOFF * 2 ** exponent)
+            self._open_until = now + backoff
+
+        if self._errors is not None:
+            self._errors.count(uuid=self.uuid, device_name=self.name, error_type=CommandTimeoutError.__name__,
+                               message=f"Command timed out ({self.consecutive_failures} in a row)")
+
+        if now - self._last_report >= FAILURE_LOG_INTERVAL:
+            _LOGGER.warning("Device %s (%s) did not answer %d command(s) in the last %d seconds (%d in a row)%s",
+                            self.name, self.uuid, self._unreported_failures,
+                            min(FAILURE_LOG_INTERVAL, now - self._last_report), self.consecutive_failures,
+                            f"; polls paused for {backoff} seconds" if backoff > 0 else "")
+            self._unreported_failures = 0
+            self._last_report = now
+
+    def as_dict(self) -> Dict[str, Any]:
+        rtt = self._stats.percentile()
+        return {
+            "name": self.name,
+            "rtt_p95_ms": round(rtt * 1000, 1) if rtt is not None else None,
+            "consecutive_failures": self.consecutive_failures,
+            "total_failures": self.total_failures,
+            "circuit_open": self.is_open(),
+        }
+
+
+class DeviceHealthTracker:
+    """Holds the health of every device, sharing the round-trip statistics among the devices of the same type"""
+
+    def __init__(self, errors: Optional[ErrorRecorder] = None):
+        self._errors = errors
+        self._devices: Dict[str, DeviceHealth] = {}
+        self._types: Dict[str, RoundTripStats] = {}
+
+    def get(self, uuid: str, name: str, device_type: str) -> DeviceHealth:
+        health = self._devices.get(uuid)
+        if health is None:
+            type_stats = self._types.get(device_type)
+            if type_stats is None:
+                type_stats = RoundTripStats()
+                self._types[device_type] = type_stats
+            health = DeviceHealth(uuid=uuid, name=name, type_stats=type_stats, errors=self._errors)
+            self._devices[uuid] = health
+        return health
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {uuid: health.as_dict() for uuid, health in self._devices.items()}
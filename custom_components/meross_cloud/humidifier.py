@@ -15,6 +15,7 @@ from . import MerossDevice
 from .common import (DOMAIN, MANAGER, HA_HUMIDIFIER, DEVICE_LIST_COORDINATOR)
 
 _LOGGER = logging.getLogger(__name__)
+PARALLEL_UPDATES = 0
 
 
 SPRAY_MODE_FROM_HA = {
@@ -144,15 +145,14 @@ class OilDiffuserEntityWrapper(MerossDevice, HumidifierEntity):
 
 
 async def async_setup_entry(hass: HomeAssistant, config_entry, async_add_entities):
-    def entity_adder_callback():
-        """Discover and adds new Meross entities"""
-        manager: MerossManager = hass.data[DOMAIN][MANAGER]  # type
+    def entity_adder_callback(devices: List[BaseDevice], removed: List[BaseDevice]):
+        """Adds the Meross entities of the newly discovered devices"""
         coordinator = hass.data[DOMAIN][DEVICE_LIST_COORDINATOR]
         new_entities = []
 
         # Add Humidifiers
-        devices = manager.find_devices(device_class=SprayMixin)
-        for d in devices:
+        humidifiers = filter(lambda d: isinstance(d, SprayMixin), devices)
+        for d in humidifiers:
             channels = [c.index for c in d.channels] if len(d.channels) > 0 else [0]
             for channel_index in channels:
                 w = HumidifierEntityWrapper(device=d, channel=channel_index, device_list_coordinator=coordinator)
@@ -160,8 +160,8 @@ async def async_setup_entry(hass: HomeAssistant, config_entry, async_add_entitie
                     new_entities.append(w)
 
         # Add OilDiffuser
-        devices = manager.find_devices(device_class=DiffuserSprayMixin)
-        for d in devices:
+        oil_diffusers = filter(lambda d: isinstance(d, DiffuserSprayMixin), devices)
+        for d in oil_diffusers:
             channels = [c.index for c in d.channels] if len(d.channels) > 0 else [0]
             for channel_index in channels:
                 w = OilDiffuserEntityWrapper(device=d, channel=channel_index, device_list_coordinator=coordinator)
@@ -170,10 +170,10 @@ async def async_setup_entry(hass: HomeAssistant, config_entry, async_add_entitie
 
         async_add_entities(new_entities, True)
 
+    # The coordinator immediately reports the devices it already knows and then only notifies the ones that
+    # get added or removed afterwards.
     coordinator = hass.data[DOMAIN][DEVICE_LIST_COORDINATOR]
-    coordinator.async_add_listener(entity_adder_callback)
-    # Run the entity adder a first time during setup
-    entity_adder_callback()
+    config_entry.async_on_unload(coordinator.async_add_device_set_listener(entity_adder_callback))
 
 # TODO: Implement entry unload
 # TODO: Unload entry
@@ -1,5 +1,5 @@
 import logging
-from typing import Optional, Dict
+from typing import Optional, Dict, List
 
 from homeassistant.core import HomeAssistant
 from meross_iot.controller.device import BaseDevice
@@ -7,16 +7,18 @@ from meross_iot.controller.mixins.light import LightMixin
 from meross_iot.controller.mixins.diffuser_light import DiffuserLightMixin
 from meross_iot.manager import MerossManager
 from meross_iot.model.http.device import HttpDeviceInfo
-from meross_iot.model.enums import DiffuserLightMode
+from meross_iot.model.enums import DiffuserLightMode, Namespace
 import homeassistant.util.color as color_util
 from homeassistant.components.light import LightEntity
 from homeassistant.components.light import ColorMode, \
     ATTR_HS_COLOR, ATTR_COLOR_TEMP, ATTR_BRIGHTNESS, ATTR_RGB_COLOR
 from homeassistant.helpers.update_coordinator import DataUpdateCoordinator
 from . import MerossDevice
+from .coalescer import CommandCoalescer
 from .common import (DOMAIN, MANAGER, HA_LIGHT, DEVICE_LIST_COORDINATOR)
 
 _LOGGER = logging.getLogger(__name__)
+PARALLEL_UPDATES = 0
 
 
 class MerossOilDiffuserLightDevice(DiffuserLightMixin, BaseDevice):
@@ -36,6 +38,7 @@ class MerossLightDevice(LightMixin, BaseDevice):
 class DiffuserLightEntityWrapper(MerossDevice, LightEntity):
     """Wrapper class to adapt the Meross OilDiffuserLight"""
     _device: MerossOilDiffuserLightDevice
+    _push_namespaces = (Namespace.DIFFUSER_LIGHT,)
     # For now, we assume OilDiffuserLight supports all the following features.
     # From Meross API it is in fact impossible to determine which exact features are supported by the device.
     _attr_supported_color_modes = {ColorMode.WHITE, ColorMode.RGB, ColorMode.COLOR_TEMP}
@@ -50,31 +53,45 @@ class DiffuserLightEntityWrapper(MerossDevice, LightEntity):
             channel=channel,
             device_list_coordinator=device_list_coordinator,
             platform=HA_LIGHT)
+        self._commands = CommandCoalescer(name=self.unique_id, send=self._async_send_light_state)
 
     async def async_turn_off(self, **kwargs) -> None:
-        await self._device.async_turn_off(channel=self._channel_id, skip_rate_limits=True)
+        await self._commands.async_submit(onoff=False, mode=None, rgb=None, brightness=None)
 
     async def async_turn_on(self, **kwargs) -> None:
-        if not self.is_on:
-            await self._device.async_turn_on(channel=self._channel_id, skip_rate_limits=True)
-
+        changes = {"onoff": True}
         if ATTR_HS_COLOR in kwargs:
             h, s = kwargs[ATTR_HS_COLOR]
             rgb = color_util.color_hsv_to_RGB(h, s, 100)
             _LOGGER.debug("color change: rgb=%r -- h=%r s=%r" % (rgb, h, s))
-            await self._device.async_set_light_mode(channel=self._channel_id, mode=DiffuserLightMode.FIXED_RGB, rgb=rgb, onoff=True, skip_rate_limits=True)
+            changes.update(mode=DiffuserLightMode.FIXED_RGB, rgb=rgb)
         elif ATTR_COLOR_TEMP in kwargs:
             mired = kwargs[ATTR_COLOR_TEMP]
             norm_value = (mired - self.min_mireds) / (self.max_mireds - self.min_mireds)
             temperature = 100 - (norm_value * 100)
             _LOGGER.debug("temperature change: mired=%r meross=%r" % (mired, temperature))
-            await self._device.async_set_light_mode(channel=self._channel_id, mode=DiffuserLightMode.FIXED_LUMINANCE, onoff=True, rgb=65293, brightness=temperature, skip_rate_limits=True)
+            changes.update(mode=DiffuserLightMode.FIXED_LUMINANCE, rgb=65293, brightness=temperature)
 
         # Brightness must always be set, so take previous luminance if not explicitly set now.
         if ATTR_BRIGHTNESS in kwargs:
             brightness = kwargs[ATTR_BRIGHTNESS] * 100 / 255
             _LOGGER.debug("brightness change: %r" % brightness)
-            await self._device.async_set_light_mode(channel=self._channel_id, luminance=brightness, skip_rate_limits=True)
+            changes["brightness"] = brightness
+
+        await self._commands.async_submit(**changes)
+
+    async def _async_send_light_state(self, state: dict) -> None:
+        if not state.get("onoff", True):
+            await self._device.async_turn_off(channel=self._channel_id, skip_rate_limits=True)
+            return
+
+        # Mode, color and brightness all fit into a single command, which turns the light on as well
+        if any(k in state for k in ("mode", "rgb", "brightness")):
+            await self._device.async_set_light_mode(channel=self._channel_id, onoff=True, mode=state.get("mode"),
+                                                    rgb=state.get("rgb"), brightness=state.get("brightness"),
+                                                    skip_rate_limits=True)
+        elif not self.is_on:
+            await self._device.async_turn_on(channel=self._channel_id, skip_rate_limits=True)
 
     @property
     def is_on(self) -> Optional[bool]:
@@ -99,6 +116,7 @@ class DiffuserLightEntityWrapper(MerossDevice, LightEntity):
 class LightEntityWrapper(MerossDevice, LightEntity):
     """Wrapper class to adapt the Meross bulbs into the Homeassistant platform"""
     _device: MerossLightDevice
+    _push_namespaces = (Namespace.CONTROL_LIGHT, Namespace.CONTROL_TOGGLEX, Namespace.CONTROL_TOGGLE)
 
     def __init__(self,
                  channel: int,
@@ -110,34 +128,50 @@ class LightEntityWrapper(MerossDevice, LightEntity):
             channel=channel,
             device_list_coordinator=device_list_coordinator,
             platform=HA_LIGHT)
+        self._commands = CommandCoalescer(name=self.unique_id, send=self._async_send_light_state)
 
     async def async_turn_off(self, **kwargs) -> None:
-        await self._device.async_turn_off(channel=self._channel_id, skip_rate_limits=True)
+        await self._commands.async_submit(onoff=False, rgb=None, temperature=None, luminance=None)
 
     async def async_turn_on(self, **kwargs) -> None:
-        if not self.is_on:
-            await self._device.async_turn_on(channel=self._channel_id, skip_rate_limits=True)
+        changes = {"onoff": True}
 
         # Color is taken from either of these 2 values, but not both.
         if ATTR_RGB_COLOR in kwargs:
-            await self._device.async_set_light_color(channel=self._channel_id, rgb=kwargs[ATTR_RGB_COLOR], onoff=True, skip_rate_limits=True)
+            changes.update(rgb=kwargs[ATTR_RGB_COLOR], temperature=None)
         elif ATTR_HS_COLOR in kwargs:
             h, s = kwargs[ATTR_HS_COLOR]
             rgb = color_util.color_hsv_to_RGB(h, s, 100)
             _LOGGER.debug("color change: rgb=%r -- h=%r s=%r" % (rgb, h, s))
-            await self._device.async_set_light_color(channel=self._channel_id, rgb=rgb, onoff=True, skip_rate_limits=True)
+            changes.update(rgb=rgb, temperature=None)
         elif ATTR_COLOR_TEMP in kwargs:
             mired = kwargs[ATTR_COLOR_TEMP]
             norm_value = (mired - self.min_mireds) / (self.max_mireds - self.min_mireds)
             temperature = 100 - (norm_value * 100)
             _LOGGER.debug("temperature change: mired=%r meross=%r" % (mired, temperature))
-            await self._device.async_set_light_color(channel=self._channel_id, temperature=temperature, skip_rate_limits=True)
+            changes.update(rgb=None, temperature=temperature)
 
         # Brightness must always be set, so take previous luminance if not explicitly set now.
         if ATTR_BRIGHTNESS in kwargs:
             brightness = kwargs[ATTR_BRIGHTNESS] * 100 / 255
             _LOGGER.debug("brightness change: %r" % brightness)
-            await self._device.async_set_light_color(channel=self._channel_id, luminance=brightness, skip_rate_limits=True)
+            changes["luminance"] = brightness
+
+        await self._commands.async_submit(**changes)
+
+    async def _async_send_light_state(self, state: dict) -> None:
+        if not state.get("onoff", True):
+            await self._device.async_turn_off(channel=self._channel_id, skip_rate_limits=True)
+            return
+
+        # Color, temperature and luminance all fit into a single command, which turns the light on as well: the
+        # light command carries the onoff flag for the bulbs that need it, the others are lit by the command itself
+        if any(k in state for k in ("rgb", "temperature", "luminance")):
+            await self._device.async_set_light_color(channel=self._channel_id, onoff=True, rgb=state.get("rgb"),
+                                                     temperature=state.get("temperature"),
+                                                     luminance=state.get("luminance"), skip_rate_limits=True)
+        elif not self.is_on:
+            await self._device.async_turn_on(channel=self._channel_id, skip_rate_limits=True)
 
     @property
     def supported_color_modes(self) -> set[ColorMode] | set[str] | None:
@@ -197,11 +231,9 @@ class LightEntityWrapper(MerossDevice, LightEntity):
 
 
 async def async_setup_entry(hass: HomeAssistant, config_entry, async_add_entities):
-    def entity_adder_callback():
-        """Discover and adds new Meross entities"""
-        manager: MerossManager = hass.data[DOMAIN][MANAGER]  # type
+    def entity_adder_callback(devices: List[BaseDevice], removed: List[BaseDevice]):
+        """Adds the Meross entities of the newly discovered devices"""
         coordinator = hass.data[DOMAIN][DEVICE_LIST_COORDINATOR]
-        devices = manager.find_devices()
 
         new_entities = []
 
@@ -223,10 +255,10 @@ async def async_setup_entry(hass: HomeAssistant, config_entry, async_add_entitie
 
         async_add_entities(new_entities, True)
 
+    # The coordinator immediately reports the devices it already knows and then only notifies the ones that
+    # get added or removed afterwards.
     coordinator = hass.data[DOMAIN][DEVICE_LIST_COORDINATOR]
-    coordinator.async_add_listener(entity_adder_callback)
-    # Run the entity adder a first time during setup
-    entity_adder_callback()
+    config_entry.async_on_unload(coordinator.async_add_device_set_listener(entity_adder_callback))
 
 
 # TODO: Implement entry unload
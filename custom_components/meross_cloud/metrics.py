@@ -0,0 +1,145 @@
+"""Lightweight instrumentation of the integration hot paths"""
+import bisect
+import functools
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterator, List, Optional
+
+from homeassistant.core import HomeAssistant
+
+from .common import (DOMAIN, METRICS, ATTR_API_CALLS_PER_SECOND, ATTR_DELAYED_API_CALLS_PER_SECOND,
+                     ATTR_DROPPED_API_CALLS_PER_SECOND, METRICS_RATE_WINDOW_SECONDS)
+
+# Upper bounds of the latency histogram buckets, in milliseconds. The last bucket collects everything slower.
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+# Hot paths whose latency is also exposed as diagnostic sensors. The other ones (e.g. the entity updates, one per
+# entity class) are only part of the diagnostics download.
+LATENCY_SENSOR_PATHS = ("command.user", "command.poll", "push_dispatch", "http_fetch.MerossCoordinator")
+
+
+class LatencyHistogram:
+    """Counts the calls of a code path, its failures and their latency distribution"""
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self._buckets: List[int] = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+
+    def observe(self, elapsed_ms: float, failed: bool = False) -> None:
+        self.calls += 1
+        if failed:
+            self.errors += 1
+        self.total_ms += elapsed_ms
+        self.max_ms = max(self.max_ms, elapsed_ms)
+        self._buckets[bisect.bisect_left(LATENCY_BUCKETS_MS, elapsed_ms)] += 1
+
+    def as_dict(self) -> Dict[str, Any]:
+        buckets = {f"<={bound}ms": count for bound, count in zip(LATENCY_BUCKETS_MS, self._buckets)}
+        buckets[f">{LATENCY_BUCKETS_MS[-1]}ms"] = self._buckets[-1]
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "avg_ms": round(self.total_ms / self.calls, 2) if self.calls > 0 else None,
+            "max_ms": round(self.max_ms, 2),
+            "buckets": buckets,
+        }
+
+
+class IntegrationMetrics:
+    """
+    Collects latency histograms of the integration hot paths, along with the rate of the commands sent to the
+    devices: all of them, the ones that had to wait for a free slot and the duplicate queries that were dropped.
+    """
+
+    def __init__(self, rate_window: float = METRICS_RATE_WINDOW_SECONDS):
+        self._rate_window = rate_window
+        self._paths: Dict[str, LatencyHistogram] = {}
+        self._events: Dict[str, Deque[float]] = {
+            ATTR_API_CALLS_PER_SECOND: deque(),
+            ATTR_DELAYED_API_CALLS_PER_SECOND: deque(),
+            ATTR_DROPPED_API_CALLS_PER_SECOND: deque(),
+        }
+
+    def observe(self, path: str, elapsed_ms: float, failed: bool = False) -> None:
+        histogram = self._paths.get(path)
+        if histogram is None:
+            histogram = LatencyHistogram()
+            self._paths[path] = histogram
+        histogram.observe(elapsed_ms, failed)
+
+    def histogram(self, path: str) -> Optional[LatencyHistogram]:
+        """Returns the latency histogram of the given path, if it ever got called"""
+        return self._paths.get(path)
+
+    @contextmanager
+    def measure(self, path: str) -> Iterator[None]:
+        """Times the enclosed block and records it under the given path"""
+        start = time.perf_counter()
+        failed = False
+        try:
+            yield
+        except Exception:
+            failed = True
+            raise
+        finally:
+            self.observe(path, (time.perf_counter() - start) * 1000, failed)
+
+    def record_api_call(self, delayed: bool = False) -> None:
+        now = time.monotonic()
+        self._record_event(ATTR_API_CALLS_PER_SECOND, now)
+        if delayed:
+            self._record_event(ATTR_DELAYED_API_CALLS_PER_SECOND, now)
+
+    def record_dropped_api_call(self) -> None:
+        self._record_event(ATTR_DROPPED_API_CALLS_PER_SECOND, time.monotonic())
+
+    def _record_event(self, attribute: str, now: float) -> None:
+        # Events are trimmed as they come, so that they do not pile up while nobody reads the rates
+        events = self._events[attribute]
+        events.append(now)
+        self._trim(events, now)
+
+    def _trim(self, events: Deque[float], now: float) -> None:
+        """Drops the events that fell out of the rate window"""
+        threshold = now - self._rate_window
+        while len(events) > 0 and events[0] < threshold:
+            events.popleft()
+
+    def rate(self, attribute: str) -> float:
+        """Returns the per-second rate of the given kind of command, averaged over the rate window"""
+        events = self._events[attribute]
+        self._trim(events, time.monotonic())
+        return round(len(events) / self._rate_window, 3)
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "rates": {attribute: self.rate(attribute) for attribute in self._events},
+            "paths": {path: histogram.as_dict() for path, histogram in sorted(self._paths.items())},
+        }
+
+
+def get_metrics(hass: HomeAssistant) -> IntegrationMetrics:
+    return hass.data[DOMAIN][METRICS]
+
+
+def measured(path: str) -> Callable:
+    """
+    Decorates a coroutine method of an object bound to HA (entities and coordinators) so that its calls are
+    recorded under the given path, suffixed by the class name.
+    """
+
+    def decorator(func: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+        @functools.wraps(func)
+        async def wrapper(self, *args, **kwargs):
+            metrics = self.hass.data.get(DOMAIN, {}).get(METRICS) if self.hass is not None else None
+            if metrics is None:
+                return await func(self, *args, **kwargs)
+            with metrics.measure(f"{path}.{type(self).__name__}"):
+                return await func(self, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,106 @@
+"""Routing of the push notifications received by a device to the entities interested in them"""
+import logging
+from typing import Awaitable, Callable, Collection, Dict, List, Optional, Set, Tuple
+
+from homeassistant.core import HomeAssistant, callback, CALLBACK_TYPE
+from meross_iot.controller.device import BaseDevice
+from meross_iot.model.enums import Namespace
+
+from .common import DOMAIN, PUSH_ROUTERS
+from .metrics import IntegrationMetrics, get_metrics
+
+_LOGGER = logging.getLogger(__name__)
+
+PushHandler = Callable[[Namespace, dict, str], Awaitable[None]]
+
+# Notifications affecting the device as a whole, always delivered to every subscriber
+DEVICE_WIDE_NAMESPACES = frozenset((Namespace.SYSTEM_ALL, Namespace.SYSTEM_ONLINE, Namespace.HUB_ONLINE,
+                                    Namespace.CONTROL_UNBIND))
+
+
+class DevicePushRouter:
+    """
+    Registers a single push handler on a device and forwards every notification only to the subscribers
+    interested in its namespace and channel. The channels targeted by a notification are read once from
+    its payload; notifications that do not carry any channel information reach every subscriber of the namespace.
+    """
+
+    def __init__(self, device: BaseDevice, metrics: Optional[IntegrationMetrics] = None):
+        self._device = device
+        self._metrics = metrics
+        # Subscribers indexed by channel; None collects the ones interested in all channels
+        self._subscribers: Dict[Optional[int], List[Tuple[PushHandler, Optional[Collection[Namespace]]]]] = {}
+        device.register_push_notification_handler_coroutine(self._async_dispatch)
+
+    @callback
+    def async_subscribe(self,
+                        handler: PushHandler,
+                        channel: Optional[int] = None,
+                        namespaces: Optional[Collection[Namespace]] = None) -> CALLBACK_TYPE:
+        """
+        Subscribes the handler to the notifications targeting the given channel (or all of them, when None),
+        restricted to the given namespaces (or all of them, when None). Device-wide notifications are always
+        delivered. Returns a function that cancels the subscription.
+        """
+        subscription = (handler, frozenset(namespaces) | DEVICE_WIDE_NAMESPACES if namespaces is not None else None)
+        subscribers = self._subscribers.setdefault(channel, [])
+        subscribers.append(subscription)
+
+        @callback
+        def unsubscribe() -> None:
+            if subscription in subscribers:
+                subscribers.remove(subscription)
+
+        return unsubscribe
+
+    @callback
+    def async_close(self) -> None:
+        """Detaches the router from the device, dropping all the subscriptions"""
+        self._device.unregister_push_notification_handler_coroutine(self._async_dispatch)
+        self._subscribers.clear()
+
+    async def _async_dispatch(self, namespace: Namespace, data: dict, device_internal_id: str) -> None:
+        if self._metrics is None:
+            await self._async_route(namespace, data, device_internal_id)
+            return
+        with self._metrics.measure("push_dispatch"):
+            await self._async_route(namespace, data, device_internal_id)
+
+    async def _async_route(self, namespace: Namespace, data: dict, device_internal_id: str) -> None:
+        channels = None if namespace in DEVICE_WIDE_NAMESPACES else _push_channels(data)
+        if channels is None:
+            targets = [s for subscribers in self._subscribers.values() for s in subscribers]
+        else:
+            targets = list(self._subscribers.get(None, []))
+            for channel in channels:
+                targets.extend(self._subscribers.get(channel, []))
+
+        for handler, namespaces in targets:
+            if namespaces is not None and namespace not in namespaces:
+                continue
+            try:
+                await handler(namespace, data, device_internal_id)
+            except Exception:
+                _LOGGER.exception("Error occurred while handling push notification %s for device %s",
+                                  namespace, self._device.name)
+
+
+def _push_channels(data: dict) -> Optional[Set[int]]:
+    """Returns the channels targeted by the given push payload, or None when the payload does not tell"""
+    channels = set()
+    for payload in data.values():
+        for element in payload if isinstance(payload, list) else [payload]:
+            if not isinstance(element, dict) or 'channel' not in element:
+                return None
+            channels.add(element['channel'])
+    return channels if len(channels) > 0 else None
+
+
+def get_push_router(hass: HomeAssistant, device: BaseDevice) -> DevicePushRouter:
+    """Returns the push router bound to the given device, creating it when needed"""
+    routers: Dict[str, DevicePushRouter] = hass.data[DOMAIN][PUSH_ROUTERS]
+    router = routers.get(device.internal_id)
+    if router is None:
+        router = DevicePushRouter(device, metrics=get_metrics(hass))
+        routers[device.internal_id] = router
+    return router
@@ -0,0 +1,138 @@
+"""Scheduling of the commands sent to the devices"""
+import asyncio
+import json
+import logging
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from homeassistant.config_entries import ConfigEntry
+from meross_iot.manager import MerossManager
+from meross_iot.model.constants import DEFAULT_COMMAND_TIMEOUT
+from meross_iot.model.enums import Namespace
+from meross_iot.model.exception import CommandTimeoutError
+
+from .common import (DEVICE_MAX_IN_FLIGHT_COMMANDS, CONF_OPT_POLL_RATE_LIMIT, POLL_RATE_LIMIT,
+                     CONF_OPT_MAX_CONCURRENT_COMMANDS, MAX_CONCURRENT_COMMANDS, ErrorRecorder)
+from .concurrency import CommandPriority, DeviceCommandScheduler, PrioritySlots, RateLimiter, _command_priority
+from .health import DeviceHealthTracker, DeviceHealth, DeviceBackoffError
+from .metrics import IntegrationMetrics
+
+_LOGGER = logging.getLogger(__name__)
+
+
+
+def get_poll_rate_limit(config_entry: ConfigEntry) -> float:
+    return config_entry.options.get(CONF_OPT_POLL_RATE_LIMIT, POLL_RATE_LIMIT)
+
+
+def get_max_concurrent_commands(config_entry: ConfigEntry) -> int:
+    return config_entry.options.get(CONF_OPT_MAX_CONCURRENT_COMMANDS, MAX_CONCURRENT_COMMANDS)
+
+
+class CommandSchedulerMixin:
+    """
+    Routes the commands issued through the manager to the scheduler of their destination device: commands to
+    different devices run in parallel, up to a global bound, while the ones to the same device are serialized.
+    Concurrent identical queries, keyed by (device uuid, namespace, method, payload), share a single request
+    rather than each sending their own message, as long as the pending request is at least as urgent as the new
+    one: polls may join any query, while user queries only join user queries, so that they are never subject to
+    the pacing, the shortened timeout or the backoff of a poll. Any command that is not a query (e.g. a SET)
+    makes the following queries to the same device go over the wire again, so they cannot be served a state
+    older than the change.
+    Polling commands are further paced by a limiter shared by all the devices, capping the load on the broker.
+    They also wait for the answer according to the round-trip times observed for the device, and are skipped
+    altogether while the device is deemed unresponsive.
+
+    Since concurrency is bounded here, per device and globally, the platforms do not bound their own entity
+    updates (PARALLEL_UPDATES = 0): doing both would serialize the updates of unrelated devices.
+    """
+
+    def __init__(self,
+                 *args,
+                 metrics: Optional[IntegrationMetrics] = None,
+                 error_recorder: Optional[ErrorRecorder] = None,
+                 poll_rate_limit: float = POLL_RATE_LIMIT,
+                 max_concurrent_commands: int = MAX_CONCURRENT_COMMANDS,
+                 **kwargs):
+        super().__init__(*args, **kwargs)
+        self._metrics = metrics
+        self.poll_limiter = RateLimiter(poll_rate_limit)
+        self.command_slots = PrioritySlots(max_concurrent_commands)
+        self.device_health = DeviceHealthTracker(errors=error_recorder)
+        self._command_schedulers: Dict[str, DeviceCommandScheduler] = {}
+        self._pending_queries: Dict[Tuple[str, str, str, str, CommandPriority], asyncio.Future] = {}
+
+    async def async_execute_cmd(self, mqtt_hostname: str, mqtt_port: int, destination_device_uuid: str, method: str,
+                                namespace, payload: dict, **kwargs):
+        scheduler = self._command_schedulers.get(destination_device_uuid)
+        if scheduler is None:
+            scheduler = DeviceCommandScheduler(name=destination_device_uuid, global_slots=self.command_slots,
+                                               max_in_flight=DEVICE_MAX_IN_FLIGHT_COMMANDS, metrics=self._metrics)
+            self._command_schedulers[destination_device_uuid] = scheduler
+
+        priority = _command_priority.get()
+        health = self._device_health(destination_device_uuid)
+        timeout = kwargs.pop("timeout", DEFAULT_COMMAND_TIMEOUT)
+        # User commands keep the timeout they were issued with
+        command_timeout = health.timeout(timeout) if priority == CommandPriority.POLL else timeout
+
+        async def _send_and_track() -> Any:
+            start = time.monotonic()
+            try:
+                response = await super(CommandSchedulerMixin, self).async_execute_cmd(
+                    mqtt_hostname=mqtt_hostname, mqtt_port=mqtt_port, destination_device_uuid=destination_device_uuid,
+                    method=method, namespace=namespace, payload=payload, timeout=command_timeout, **kwargs)
+            except CommandTimeoutError:
+                health.record_failure()
+                raise
+            health.record_success(time.monotonic() - start)
+            return response
+
+        async def _send() -> Any:
+            if priority == CommandPriority.POLL:
+                if health.is_open():
+                    raise DeviceBackoffError(message=f"Polls to device {health.name} are paused after "
+                                                     f"{health.consecutive_failures} timeouts in a row",
+                                             target_device_uuid=destination_device_uuid, timeout=0)
+                await self.poll_limiter.async_acquire()
+            return await scheduler.async_execute(send=_send_and_track, priority=priority)
+
+        if method.upper() != "GET":
+            for key in [k for k in self._pending_queries if k[0] == destination_device_uuid]:
+                del self._pending_queries[key]
+            return await _send()
+
+        query = (destination_device_uuid, Namespace(namespace).value, method.upper(),
+                 json.dumps(payload, sort_keys=True, default=str))
+        key = (*query, priority)
+        # Join the most urgent pending query among the ones at least as urgent as this one
+        pending = next((self._pending_queries[(*query, p)] for p in sorted(CommandPriority)
+                        if p <= priority and (*query, p) in self._pending_queries), None)
+        if pending is None:
+            pending = asyncio.ensure_future(_send())
+            pending.add_done_callback(lambda f: self._async_query_done(key, f))
+            self._pending_queries[key] = pending
+        else:
+            _LOGGER.debug("Sharing the pending %s query to %s rather than sending a duplicate", key[1],
+                          destination_device_uuid)
+            if self._metrics is not None:
+                self._metrics.record_dropped_api_call()
+        # Callers giving up must not cancel the request on behalf of the others
+        return await asyncio.shield(pending)
+
+    def _device_health(self, uuid: str) -> DeviceHealth:
+        device = self._device_registry.lookup_base_by_uuid(uuid)
+        return self.device_health.get(uuid=uuid,
+                                      name=device.name if device is not None else uuid,
+                                      device_type=device.type if device is not None else "unknown")
+
+    def _async_query_done(self, key: Tuple[str, str, str, str, CommandPriority], future: asyncio.Future) -> None:
+        if self._pending_queries.get(key) is future:
+            del self._pending_queries[key]
+        # Retrieve the outcome even when every caller gave up on it
+        if not future.cancelled():
+            future.exception()
+
+
+class SchedulingMerossManager(CommandSchedulerMixin, MerossManager):
+    """Meross manager whose commands go through a per-device scheduler"""
@@ -1,7 +1,7 @@
 import logging
-from datetime import datetime
+from datetime import date
 from datetime import timedelta
-from typing import Optional, Dict
+from typing import Optional, Dict, List
 
 from homeassistant.core import HomeAssistant
 from meross_iot.controller.device import BaseDevice, GenericSubDevice, HubDevice
@@ -9,20 +9,24 @@ from meross_iot.controller.mixins.consumption import ConsumptionXMixin
 from meross_iot.controller.mixins.electricity import ElectricityMixin
 from meross_iot.controller.subdevice import Ms100Sensor, Mts100v3Valve
 from meross_iot.manager import MerossManager
-from meross_iot.model.enums import OnlineStatus
-from meross_iot.model.exception import CommandTimeoutError
+from meross_iot.model.enums import OnlineStatus, Namespace
 from meross_iot.model.http.device import HttpDeviceInfo
+from meross_iot.model.plugin.power import PowerInfo
 
 from homeassistant.components.sensor import SensorStateClass, SensorEntity, SensorDeviceClass
-from homeassistant.const import PERCENTAGE, UnitOfTemperature, UnitOfPower
+from homeassistant.const import PERCENTAGE, UnitOfTemperature, UnitOfPower, EntityCategory
 from homeassistant.helpers.typing import StateType
 from homeassistant.helpers.update_coordinator import DataUpdateCoordinator
 from . import MerossDevice
-from .common import (DOMAIN, MANAGER, log_exception, HA_SENSOR,
-                     HA_SENSOR_POLL_INTERVAL_SECONDS, invoke_method_or_property, DEVICE_LIST_COORDINATOR)
+from .coordinator import (ElectricitySampler, ConsumptionCache, HubSubdevicePoller, get_electricity_sampler,
+                          get_consumption_cache, get_consumption_update_interval, get_hub_poller)
+from .common import (DOMAIN, MANAGER, HA_SENSOR,
+                     HA_SENSOR_POLL_INTERVAL_SECONDS, invoke_method_or_property, DEVICE_LIST_COORDINATOR,
+                     ATTR_API_CALLS_PER_SECOND, ATTR_DELAYED_API_CALLS_PER_SECOND, ATTR_DROPPED_API_CALLS_PER_SECOND)
+from .metrics import IntegrationMetrics, LATENCY_SENSOR_PATHS, get_metrics, measured
 
 _LOGGER = logging.getLogger(__name__)
-PARALLEL_UPDATES = 2
+PARALLEL_UPDATES = 0
 SCAN_INTERVAL = timedelta(seconds=HA_SENSOR_POLL_INTERVAL_SECONDS)
 
 
@@ -61,279 +65,295 @@ class GenericSensorWrapper(MerossDevice, SensorEntity):
         return invoke_method_or_property(self._device, self._device_method_or_property)
 
 
-class Ms100TemperatureSensorWrapper(GenericSensorWrapper):
-    def __init__(self, device: Ms100Sensor, device_list_coordinator: DataUpdateCoordinator[Dict[str, HttpDeviceInfo]],
-                 channel: int = 0):
-        super().__init__(
-            sensor_class=SensorDeviceClass.TEMPERATURE,
-            measurement_unit=UnitOfTemperature.CELSIUS,
-            device_method_or_property='last_sampled_temperature',
-            state_class=SensorStateClass.MEASUREMENT,
-            device=device,
-            device_list_coordinator=device_list_coordinator,
-            channel=channel)
+class ElectricitySensorDevice(ElectricityMixin, BaseDevice):
+    """ Helper type """
+    pass
+
+
+class EnergySensorDevice(ConsumptionXMixin, BaseDevice):
+    """ Helper type """
+    pass
 
 
-class Ms100HumiditySensorWrapper(GenericSensorWrapper):
-    def __init__(self, device: Ms100Sensor, device_list_coordinator: DataUpdateCoordinator[Dict[str, HttpDeviceInfo]],
+class CoordinatedSensorWrapper(GenericSensorWrapper):
+    """Base class for sensors whose data is collected by a coordinator shared among the entities of the same device"""
+    # Data pushed by the device reaches us through the coordinator
+    _push_namespaces = ()
+
+    def __init__(self,
+                 sensor_class: str,
+                 measurement_unit: Optional[str],
+                 device_method_or_property: str,
+                 state_class: str,
+                 device: BaseDevice,
+                 data_coordinator: DataUpdateCoordinator,
+                 device_list_coordinator: DataUpdateCoordinator[Dict[str, HttpDeviceInfo]],
                  channel: int = 0):
-        super().__init__(sensor_class=SensorDeviceClass.HUMIDITY,
-                         measurement_unit=PERCENTAGE,
-                         device_method_or_property='last_sampled_humidity',
-                         state_class=SensorStateClass.MEASUREMENT,
+        super().__init__(sensor_class=sensor_class,
+                         measurement_unit=measurement_unit,
+                         device_method_or_property=device_method_or_property,
+                         state_class=state_class,
                          device=device,
                          device_list_coordinator=device_list_coordinator,
                          channel=channel)
+        self._data_coordinator = data_coordinator
+        self._cb_async_remove_data_listener = None
 
+    @property
+    def should_poll(self) -> bool:
+        # The data coordinator notifies us whenever new data is available
+        return False
 
-class Mts100TemperatureSensorWrapper(GenericSensorWrapper):
-    _device: Mts100v3Valve
-
-    def __init__(self, device: Mts100v3Valve,
-                 device_list_coordinator: DataUpdateCoordinator[Dict[str, HttpDeviceInfo]]):
-        super().__init__(sensor_class=SensorDeviceClass.TEMPERATURE,
-                         measurement_unit=UnitOfTemperature.CELSIUS,
-                         device_method_or_property='last_sampled_temperature',
-                         state_class=SensorStateClass.MEASUREMENT,
-                         device_list_coordinator=device_list_coordinator,
-                         device=device)
-
+    @measured("update")
     async def async_update(self):
         if self._device.online_status == OnlineStatus.ONLINE:
-            try:
-                _LOGGER.debug(f"Refreshing instant metrics for device {self.name}")
-                await self._device.async_get_temperature()
-            except CommandTimeoutError as e:
-                log_exception(logger=_LOGGER, device=self._device)
+            # Requests issued by sibling entities are debounced by the coordinator, so they result in a single refresh
+            await self._data_coordinator.async_request_refresh()
 
-    @property
-    def should_poll(self) -> bool:
-        return True
+    async def async_added_to_hass(self) -> None:
+        await super().async_added_to_hass()
+        self._cb_async_remove_data_listener = self._data_coordinator.async_add_listener(self.async_write_ha_state)
 
+    async def async_will_remove_from_hass(self) -> None:
+        if self._cb_async_remove_data_listener is not None:
+            self._cb_async_remove_data_listener()
+        await super().async_will_remove_from_hass()
 
-class ElectricitySensorDevice(ElectricityMixin, BaseDevice):
-    """ Helper type """
-    pass
 
+class ElectricitySensorWrapper(CoordinatedSensorWrapper):
+    """Base class for sensors fed by the electricity sampler shared among the entities of the same device"""
+    _device: ElectricitySensorDevice
+    _data_coordinator: ElectricitySampler
 
-class EnergySensorDevice(ConsumptionXMixin, BaseDevice):
-    """ Helper type """
-    pass
+    def __init__(self,
+                 sensor_class: str,
+                 measurement_unit: str,
+                 device: ElectricitySensorDevice,
+                 sampler: ElectricitySampler,
+                 device_list_coordinator: DataUpdateCoordinator[Dict[str, HttpDeviceInfo]],
+                 channel: int = 0):
+        super().__init__(sensor_class=sensor_class,
+                         measurement_unit=measurement_unit,
+                         device_method_or_property='get_last_sample',
+                         state_class=SensorStateClass.MEASUREMENT,
+                         device=device,
+                         data_coordinator=sampler,
+                         device_list_coordinator=device_list_coordinator,
+                         channel=channel)
 
+    def _last_sample(self) -> Optional[PowerInfo]:
+        return self._data_coordinator.get_sample(channel=self._channel_id)
 
-class PowerSensorWrapper(GenericSensorWrapper):
-    _device: ElectricitySensorDevice
 
-    def __init__(self, device: ElectricitySensorDevice,
+class PowerSensorWrapper(ElectricitySensorWrapper):
+    def __init__(self, device: ElectricitySensorDevice, sampler: ElectricitySampler,
                  device_list_coordinator: DataUpdateCoordinator[Dict[str, HttpDeviceInfo]], channel: int = 0):
         super().__init__(sensor_class=SensorDeviceClass.POWER,
                          measurement_unit=UnitOfPower.WATT,
-                         device_method_or_property='get_last_sample',
-                         state_class=SensorStateClass.MEASUREMENT,
                          device=device,
+                         sampler=sampler,
                          device_list_coordinator=device_list_coordinator,
                          channel=channel)
 
-    @property
-    def should_poll(self) -> bool:
-        return True
-
-    # For ElectricityMixin devices we need to explicitly call the async_get_instant_metrics
-    async def async_update(self):
-        if self._device.online_status == OnlineStatus.ONLINE:
-            try:
-                # We only call the explicit method if the sampled value is older than 10 seconds.
-                power_info = self._device.get_last_sample(channel=self._channel_id)
-                now = datetime.utcnow()
-                if power_info is None or (now - power_info.sample_timestamp).total_seconds() > 10:
-                    # Force device refresh
-                    _LOGGER.debug(f"Refreshing instant metrics for device {self.name}")
-                    await self._device.async_get_instant_metrics(channel=self._channel_id)
-                else:
-                    # Use the cached value
-                    _LOGGER.debug("Skipping data refresh for %s as its value is recent enough", self.name)
-
-            except CommandTimeoutError as e:
-                log_exception(logger=_LOGGER, device=self._device)
-                pass
-
     @property
     def native_value(self) -> StateType:
-        sample = self._device.get_last_sample(channel=self._channel_id)
+        sample = self._last_sample()
         if sample is not None:
             return sample.power
 
 
-class CurrentSensorWrapper(GenericSensorWrapper):
-    _device: ElectricitySensorDevice
-
-    def __init__(self, device: ElectricitySensorDevice,
+class CurrentSensorWrapper(ElectricitySensorWrapper):
+    def __init__(self, device: ElectricitySensorDevice, sampler: ElectricitySampler,
                  device_list_coordinator: DataUpdateCoordinator[Dict[str, HttpDeviceInfo]], channel: int = 0):
         super().__init__(sensor_class=SensorDeviceClass.CURRENT,
                          measurement_unit="A",
-                         device_method_or_property='get_last_sample',
-                         state_class=SensorStateClass.MEASUREMENT,
                          device=device,
+                         sampler=sampler,
                          device_list_coordinator=device_list_coordinator,
                          channel=channel)
 
-    # For ElectricityMixin devices we need to explicitly call the async_Get_instant_metrics
-    async def async_update(self):
-        if self._device.online_status == OnlineStatus.ONLINE:
-            try:
-                # We only call the explicit method if the sampled value is older than 10 seconds.
-                power_info = self._device.get_last_sample(channel=self._channel_id)
-                now = datetime.utcnow()
-                if power_info is None or (now - power_info.sample_timestamp).total_seconds() > 10:
-                    # Force device refresh
-                    _LOGGER.debug(f"Refreshing instant metrics for device {self.name}")
-                    await self._device.async_get_instant_metrics(channel=self._channel_id)
-                else:
-                    # Use the cached value
-                    _LOGGER.debug(f"Skipping data refresh for {self.name} as its value is recent enough")
-
-            except CommandTimeoutError as e:
-                log_exception(logger=_LOGGER, device=self._device)
-                pass
-
     @property
     def native_value(self) -> StateType:
-        sample = self._device.get_last_sample(channel=self._channel_id)
+        sample = self._last_sample()
         if sample is not None:
             return sample.current
         return 0
 
-    @property
-    def should_poll(self) -> bool:
-        return True
-
-
-class VoltageSensorWrapper(GenericSensorWrapper):
-    _device: ElectricitySensorDevice
 
-    def __init__(self, device: ElectricitySensorDevice,
+class VoltageSensorWrapper(ElectricitySensorWrapper):
+    def __init__(self, device: ElectricitySensorDevice, sampler: ElectricitySampler,
                  device_list_coordinator: DataUpdateCoordinator[Dict[str, HttpDeviceInfo]], channel: int = 0):
         super().__init__(sensor_class=SensorDeviceClass.VOLTAGE,
                          measurement_unit="V",
-                         device_method_or_property='get_last_sample',
-                         state_class=SensorStateClass.MEASUREMENT,
                          device=device,
+                         sampler=sampler,
                          device_list_coordinator=device_list_coordinator,
                          channel=channel)
 
-    # For ElectricityMixin devices we need to explicitly call the async_Get_instant_metrics
-    async def async_update(self):
-        if self._device.online_status == OnlineStatus.ONLINE:
-            try:
-                # We only call the explicit method if the sampled value is older than 10 seconds.
-                power_info = self._device.get_last_sample(channel=self._channel_id)
-                now = datetime.utcnow()
-                if power_info is None or (now - power_info.sample_timestamp).total_seconds() > 10:
-                    # Force device refresh
-                    _LOGGER.debug(f"Refreshing instant metrics for device {self.name}")
-                    await self._device.async_get_instant_metrics(channel=self._channel_id)
-                else:
-                    # Use the cached value
-                    _LOGGER.debug(f"Skipping data refresh for {self.name} as its value is recent enough")
-
-            except CommandTimeoutError as e:
-                log_exception(logger=_LOGGER, device=self._device)
-                pass
-
     @property
     def native_value(self) -> StateType:
-        sample = self._device.get_last_sample(channel=self._channel_id)
+        sample = self._last_sample()
         if sample is not None:
             return sample.voltage
         return 0
 
-    @property
-    def should_poll(self) -> bool:
-        return True
 
-
-class EnergySensorWrapper(GenericSensorWrapper):
+class EnergySensorWrapper(CoordinatedSensorWrapper):
     _device: EnergySensorDevice
+    _data_coordinator: ConsumptionCache
 
-    def __init__(self, device: EnergySensorDevice,
+    def __init__(self, device: EnergySensorDevice, consumption_cache: ConsumptionCache,
                  device_list_coordinator: DataUpdateCoordinator[Dict[str, HttpDeviceInfo]], channel: int = 0):
         super().__init__(sensor_class=SensorDeviceClass.ENERGY,
                          measurement_unit="kWh",
                          device_method_or_property='async_get_daily_power_consumption',
                          state_class=SensorStateClass.TOTAL_INCREASING,
                          device=device,
+                         data_coordinator=consumption_cache,
                          device_list_coordinator=device_list_coordinator,
                          channel=channel)
 
-        # Device properties
-        self._daily_consumption = None
+    @property
+    def native_value(self) -> StateType:
+        if self._data_coordinator.data is not None:
+            total = self._data_coordinator.get_daily_consumption(channel=self._channel_id, day=date.today())
+            return total if total is not None else 0
 
-    # For ElectricityMixin devices we need to explicitly call the async_Get_instant_metrics
-    async def async_update(self):
-        if self.online:
-            await super().async_update()
 
-            _LOGGER.debug(f"Refreshing instant metrics for device {self.name}")
-            self._daily_consumption = await self._device.async_get_daily_power_consumption(channel=self._channel_id)
+class Ms100TemperatureSensorWrapper(CoordinatedSensorWrapper):
+    """MS100 temperature sensor, whose readings are polled for all the sensors of the hub at once"""
+    _device: Ms100Sensor
+    _push_namespaces = (Namespace.HUB_SENSOR_ALL, Namespace.HUB_SENSOR_TEMPHUM)
 
-    @property
-    def native_value(self) -> StateType:
-        if self._daily_consumption is not None:
-            today = datetime.today()
-            total = 0
-            daystart = datetime(year=today.year, month=today.month, day=today.day, hour=0, second=0)
-            for x in self._daily_consumption:
-              if x['date'] == daystart:
-                total = x['total_consumption_kwh']
-            return total
+    def __init__(self, device: Ms100Sensor,
+                 hub_poller: HubSubdevicePoller,
+                 device_list_coordinator: DataUpdateCoordinator[Dict[str, HttpDeviceInfo]], channel: int = 0):
+        super().__init__(sensor_class=SensorDeviceClass.TEMPERATURE,
+                         measurement_unit=UnitOfTemperature.CELSIUS,
+                         device_method_or_property='last_sampled_temperature',
+                         state_class=SensorStateClass.MEASUREMENT,
+                         device=device,
+                         data_coordinator=hub_poller,
+                         device_list_coordinator=device_list_coordinator,
+                         channel=channel)
 
-    @property
-    def should_poll(self) -> bool:
-        return True
+
+class Ms100HumiditySensorWrapper(CoordinatedSensorWrapper):
+    """MS100 humidity sensor, whose readings are polled for all the sensors of the hub at once"""
+    _device: Ms100Sensor
+    _push_namespaces = (Namespace.HUB_SENSOR_ALL, Namespace.HUB_SENSOR_TEMPHUM)
+
+    def __init__(self, device: Ms100Sensor,
+                 hub_poller: HubSubdevicePoller,
+                 device_list_coordinator: DataUpdateCoordinator[Dict[str, HttpDeviceInfo]], channel: int = 0):
+        super().__init__(sensor_class=SensorDeviceClass.HUMIDITY,
+                         measurement_unit=PERCENTAGE,
+                         device_method_or_property='last_sampled_humidity',
+                         state_class=SensorStateClass.MEASUREMENT,
+                         device=device,
+                         data_coordinator=hub_poller,
+                         device_list_coordinator=device_list_coordinator,
+                         channel=channel)
 
 
-class BatterySensorWrapper(GenericSensorWrapper):
+class Mts100TemperatureSensorWrapper(CoordinatedSensorWrapper):
+    """Valve temperature sensor, whose readings are polled for all the valves of the hub at once"""
+    _device: Mts100v3Valve
+    _push_namespaces = (Namespace.HUB_MTS100_TEMPERATURE, Namespace.HUB_MTS100_ALL)
+
+    def __init__(self, device: Mts100v3Valve,
+                 hub_poller: HubSubdevicePoller,
+                 device_list_coordinator: DataUpdateCoordinator[Dict[str, HttpDeviceInfo]]):
+        super().__init__(sensor_class=SensorDeviceClass.TEMPERATURE,
+                         measurement_unit=UnitOfTemperature.CELSIUS,
+                         device_method_or_property='last_sampled_temperature',
+                         state_class=SensorStateClass.MEASUREMENT,
+                         device=device,
+                         data_coordinator=hub_poller,
+                         device_list_coordinator=device_list_coordinator)
+
+
+class BatterySensorWrapper(CoordinatedSensorWrapper):
+    """Subdevice battery sensor, whose readings are polled for all the subdevices of the hub at once"""
     _device: GenericSubDevice
+    _data_coordinator: HubSubdevicePoller
 
     def __init__(self, device: GenericSubDevice,
+                 hub_poller: HubSubdevicePoller,
                  device_list_coordinator: DataUpdateCoordinator[Dict[str, HttpDeviceInfo]], channel: int = 0):
         super().__init__(sensor_class=SensorDeviceClass.BATTERY,
                          measurement_unit="%",
                          device_method_or_property='async_get_battery_life',
                          state_class=SensorStateClass.MEASUREMENT,
                          device=device,
+                         data_coordinator=hub_poller,
                          device_list_coordinator=device_list_coordinator,
                          channel=channel)
 
-        # Device properties
-        self._battery_percentage = None
+    @property
+    def native_value(self) -> StateType:
+        battery = self._data_coordinator.get_battery(self._device.subdevice_id)
+        if battery is not None:
+            return battery.remaining_charge
 
-    async def async_update(self):
-        if self.online:
-            await super().async_update()
 
-            _LOGGER.debug(f"Refreshing battery state info for device {self.name}")
-            self._battery_percentage = await self._device.async_get_battery_life()
+class ApiCallsRateSensor(SensorEntity):
+    """Diagnostic sensor exposing the rate of the commands sent to the devices, disabled by default"""
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_entity_registry_enabled_default = False
+    _attr_state_class = SensorStateClass.MEASUREMENT
+    _attr_native_unit_of_measurement = "calls/s"
+    _attr_icon = "mdi:swap-vertical"
+
+    def __init__(self, metrics: IntegrationMetrics, entry_id: str, attribute: str):
+        self._metrics = metrics
+        self._attribute = attribute
+        self._attr_unique_id = f"{DOMAIN}_{entry_id}_{attribute}"
+        self._attr_name = f"Meross {attribute.replace('_', ' ')}"
 
     @property
     def native_value(self) -> StateType:
-        if self._battery_percentage is not None:
-            return self._battery_percentage.remaining_charge
+        return self._metrics.rate(self._attribute)
+
+
+class LatencySensor(SensorEntity):
+    """
+    Diagnostic sensor exposing the average latency of a hot path, disabled by default. The latency histogram
+    is exposed as attributes.
+    """
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_entity_registry_enabled_default = False
+    _attr_state_class = SensorStateClass.MEASUREMENT
+    _attr_native_unit_of_measurement = "ms"
+    _attr_icon = "mdi:timer-outline"
+
+    def __init__(self, metrics: IntegrationMetrics, entry_id: str, path: str):
+        self._metrics = metrics
+        self._path = path
+        self._attr_unique_id = f"{DOMAIN}_{entry_id}_latency_{path}"
+        self._attr_name = f"Meross {path.replace('_', ' ').replace('.', ' ')} latency"
 
     @property
-    def should_poll(self) -> bool:
-        return True
+    def native_value(self) -> StateType:
+        histogram = self._metrics.histogram(self._path)
+        if histogram is not None:
+            return histogram.as_dict()["avg_ms"]
+
+    @property
+    def extra_state_attributes(self) -> Optional[Dict]:
+        histogram = self._metrics.histogram(self._path)
+        if histogram is not None:
+            return histogram.as_dict()
 
 
 # ----------------------------------------------
 # PLATFORM METHODS
 # ----------------------------------------------
 async def async_setup_entry(hass: HomeAssistant, config_entry, async_add_entities):
-    def entity_adder_callback():
-        """Discover and adds new Meross entities"""
-        manager: MerossManager = hass.data[DOMAIN][MANAGER]  # type
+    def entity_adder_callback(devices: List[BaseDevice], removed: List[BaseDevice]):
+        """Adds the Meross entities of the newly discovered devices"""
         coordinator = hass.data[DOMAIN][DEVICE_LIST_COORDINATOR]
-        devices = manager.find_devices()
+        consumption_update_interval = get_consumption_update_interval(config_entry)
 
         new_entities = []
 
@@ -341,50 +361,75 @@ async def async_setup_entry(hass: HomeAssistant, config_entry, async_add_entitie
         # -> Temperature-Humidity (Ms100Sensor)
         # -> Power-sensing smart plugs (Mss310)
         # -> MTS100 Valve temperature (MTS100V3)
-        humidity_temp_sensors = filter(lambda d: isinstance(d, Ms100Sensor), devices)
-        mts100_temp_sensors = filter(lambda d: isinstance(d, Mts100v3Valve), devices)
+        # Subdevices are polled through their hub: the ones whose hub is gone in the meantime get no entity
+        hub_pollers = {}
+        for d in filter(lambda d: isinstance(d, GenericSubDevice), devices):
+            hub_poller = get_hub_poller(hass, d)
+            if hub_poller is not None:
+                hub_pollers[d.internal_id] = hub_poller
+
+        humidity_temp_sensors = filter(lambda d: isinstance(d, Ms100Sensor) and d.internal_id in hub_pollers, devices)
+        mts100_temp_sensors = filter(lambda d: isinstance(d, Mts100v3Valve) and d.internal_id in hub_pollers, devices)
         power_sensors = filter(lambda d: isinstance(d, ElectricityMixin), devices)
         energy_sensors = filter(lambda d: isinstance(d, ConsumptionXMixin), devices)
-        subdevs = filter(lambda d: isinstance(d, GenericSubDevice), devices)
+        subdevs = filter(lambda d: isinstance(d, GenericSubDevice) and d.internal_id in hub_pollers, devices)
 
         # Add MS100 Temperature & Humidity sensors
         for d in humidity_temp_sensors:
-            new_entities.append(Ms100HumiditySensorWrapper(device=d, device_list_coordinator=coordinator, channel=0))
-            new_entities.append(Ms100TemperatureSensorWrapper(device=d, device_list_coordinator=coordinator, channel=0))
+            new_entities.append(Ms100HumiditySensorWrapper(device=d, hub_poller=hub_pollers[d.internal_id],
+                                                           device_list_coordinator=coordinator, channel=0))
+            new_entities.append(Ms100TemperatureSensorWrapper(device=d, hub_poller=hub_pollers[d.internal_id],
+                                                              device_list_coordinator=coordinator, channel=0))
 
         # Add MTS100Valve Temperature sensors
         for d in mts100_temp_sensors:
-            new_entities.append(Mts100TemperatureSensorWrapper(device=d, device_list_coordinator=coordinator))
+            new_entities.append(Mts100TemperatureSensorWrapper(device=d, hub_poller=hub_pollers[d.internal_id],
+                                                               device_list_coordinator=coordinator))
 
         # Add Power Sensors
         for d in power_sensors:
+            sampler = get_electricity_sampler(hass, d)
             channels = [c.index for c in d.channels] if len(d.channels) > 0 else [0]
             for channel_index in channels:
                 new_entities.append(
-                    PowerSensorWrapper(device=d, device_list_coordinator=coordinator, channel=channel_index))
+                    PowerSensorWrapper(device=d, sampler=sampler, device_list_coordinator=coordinator,
+                                       channel=channel_index))
                 new_entities.append(
-                    CurrentSensorWrapper(device=d, device_list_coordinator=coordinator, channel=channel_index))
+                    CurrentSensorWrapper(device=d, sampler=sampler, device_list_coordinator=coordinator,
+                                         channel=channel_index))
                 new_entities.append(
-                    VoltageSensorWrapper(device=d, device_list_coordinator=coordinator, channel=channel_index))
+                    VoltageSensorWrapper(device=d, sampler=sampler, device_list_coordinator=coordinator,
+                                         channel=channel_index))
 
         # Add Energy Sensors
         for d in energy_sensors:
+            consumption_cache = get_consumption_cache(hass, d, update_interval=consumption_update_interval)
             channels = [c.index for c in d.channels] if len(d.channels) > 0 else [0]
             for channel_index in channels:
                 new_entities.append(
-                     EnergySensorWrapper(device=d, device_list_coordinator=coordinator, channel=channel_index))
+                    EnergySensorWrapper(device=d, consumption_cache=consumption_cache,
+                                        device_list_coordinator=coordinator, channel=channel_index))
 
         # Add battery level sensors for subdevices
         for s in subdevs:
-            new_entities.append(BatterySensorWrapper(device=s, device_list_coordinator=coordinator, channel=0))
+            new_entities.append(BatterySensorWrapper(device=s, hub_poller=hub_pollers[s.internal_id],
+                                                     device_list_coordinator=coordinator, channel=0))
 
         unique_new_devs = filter(lambda d: d.unique_id not in hass.data[DOMAIN]["ADDED_ENTITIES_IDS"], new_entities)
         async_add_entities(list(unique_new_devs), True)
 
+    # The coordinator immediately reports the devices it already knows and then only notifies the ones that
+    # get added or removed afterwards.
     coordinator = hass.data[DOMAIN][DEVICE_LIST_COORDINATOR]
-    coordinator.async_add_listener(entity_adder_callback)
-    # Run the entity adder a first time during setup
-    entity_adder_callback()
+    config_entry.async_on_unload(coordinator.async_add_device_set_listener(entity_adder_callback))
+
+    # Integration-wide diagnostic sensors
+    metrics = get_metrics(hass)
+    async_add_entities([ApiCallsRateSensor(metrics=metrics, entry_id=config_entry.entry_id, attribute=attribute)
+                        for attribute in (ATTR_API_CALLS_PER_SECOND, ATTR_DELAYED_API_CALLS_PER_SECOND,
+                                          ATTR_DROPPED_API_CALLS_PER_SECOND)])
+    async_add_entities([LatencySensor(metrics=metrics, entry_id=config_entry.entry_id, path=path)
+                        for path in LATENCY_SENSOR_PATHS])
 
 
 # TODO: Implement entry unload
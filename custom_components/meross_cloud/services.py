@@ -0,0 +1,111 @@
+"""Integration-level services"""
+import asyncio
+import logging
+from typing import Dict, List, Tuple
+
+import homeassistant.helpers.config_validation as cv
+import voluptuous as vol
+from homeassistant.const import ATTR_ENTITY_ID, ATTR_STATE
+from homeassistant.core import HomeAssistant, ServiceCall, ServiceResponse, SupportsResponse
+from homeassistant.helpers import entity_registry as er
+from meross_iot.controller.device import BaseDevice
+from meross_iot.controller.mixins.toggle import ToggleXMixin, ToggleMixin
+from meross_iot.manager import MerossManager
+from meross_iot.model.enums import Namespace
+
+from .common import DOMAIN, MANAGER, HA_SWITCH, BULK_SET_CONCURRENCY, calculate_id
+
+_LOGGER = logging.getLogger(__name__)
+
+SERVICE_BULK_SET = "bulk_set"
+
+BULK_SET_SCHEMA = vol.Schema(
+    {
+        vol.Required(ATTR_ENTITY_ID): cv.entity_ids,
+        vol.Required(ATTR_STATE): cv.boolean,
+    }
+)
+
+
+def async_setup_services(hass: HomeAssistant) -> None:
+    """Registers the integration services"""
+
+    async def _async_bulk_set(call: ServiceCall) -> ServiceResponse:
+        manager: MerossManager = hass.data[DOMAIN][MANAGER]
+        results = await async_bulk_set(hass=hass, manager=manager, entity_ids=call.data[ATTR_ENTITY_ID],
+                                       onoff=call.data[ATTR_STATE])
+        return {"results": results}
+
+    hass.services.async_register(DOMAIN, SERVICE_BULK_SET, _async_bulk_set, schema=BULK_SET_SCHEMA,
+                                 supports_response=SupportsResponse.OPTIONAL)
+
+
+def async_unload_services(hass: HomeAssistant) -> None:
+    """Removes the integration services"""
+    hass.services.async_remove(DOMAIN, SERVICE_BULK_SET)
+
+
+async def async_bulk_set(hass: HomeAssistant,
+                         manager: MerossManager,
+                         entity_ids: List[str],
+                         onoff: bool) -> Dict[str, dict]:
+    """
+    Switches the channels behind the given switch entities on or off. Channels of the same device are
+    sent as a single command, while devices are controlled concurrently with bounded parallelism.
+    Returns the outcome for every requested entity.
+    """
+    # Index the switch channels we know by the unique id of the entity wrapping them
+    channels_by_id: Dict[str, Tuple[BaseDevice, int]] = {}
+    for device in manager.find_devices():
+        if not isinstance(device, (ToggleXMixin, ToggleMixin)):
+            continue
+        channels = [c.index for c in device.channels] if len(device.channels) > 0 else [0]
+        for channel in channels:
+            channels_by_id[calculate_id(platform=HA_SWITCH, uuid=device.internal_id, channel=channel)] = (device,
+                                                                                                          channel)
+
+    results: Dict[str, dict] = {}
+    targets: Dict[str, Tuple[BaseDevice, Dict[int, str]]] = {}
+    registry = er.async_get(hass)
+    for entity_id in entity_ids:
+        entry = registry.async_get(entity_id)
+        target = channels_by_id.get(entry.unique_id) if entry is not None and entry.platform == DOMAIN else None
+        if target is None:
+            results[entity_id] = {"success": False, "error": "Not a Meross switch entity"}
+            continue
+        device, channel = target
+        targets.setdefault(device.internal_id, (device, {}))[1][channel] = entity_id
+
+    semaphore = asyncio.Semaphore(BULK_SET_CONCURRENCY)
+
+    async def _async_set_device(device: BaseDevice, entity_by_channel: Dict[int, str]) -> None:
+        async with semaphore:
+            try:
+                await _async_set_channels(device=device, channels=list(entity_by_channel.keys()), onoff=onoff)
+                outcome = {"success": True, "error": None}
+            except Exception as e:
+                _LOGGER.warning("Bulk set failed for device %s: %s", device.name, e)
+                outcome = {"success": False, "error": str(e) or type(e).__name__}
+        for entity_id in entity_by_channel.values():
+            results[entity_id] = outcome
+
+    await asyncio.gather(*(_async_set_device(d, e) for d, e in targets.values()))
+    return results
+
+
+async def _async_set_channels(device: BaseDevice, channels: List[int], onoff: bool) -> None:
+    if isinstance(device, ToggleXMixin):
+        # A single ToggleX command can carry all the channels of the device
+        payload = {'togglex': [{"onoff": 1 if onoff else 0, "channel": c} for c in channels]}
+        await device._execute_command(method="SET", namespace=Namespace.CONTROL_TOGGLEX, payload=payload)
+        # Update the local state and the entities the same way a push notification would
+        await device.async_handle_push_notification(namespace=Namespace.CONTROL_TOGGLEX, data=payload)
+    else:
+        for channel in channels:
+            if onoff:
+                await device.async_turn_on(channel=channel, skip_rate_limits=True)
+            else:
+                await device.async_turn_off(channel=channel, skip_rate_limits=True)
+            await device.async_handle_push_notification(namespace=Namespace.CONTROL_TOGGLE,
+                                                        data={'toggle': {"onoff": 1 if onoff else 0,
+                                                                         "channel": channel}})
@@ -0,0 +1,195 @@
+"""Persistent snapshots of the discovered devices, used to rebuild them without a full discovery on warm restarts"""
+import asyncio
+import logging
+from typing import Dict, Iterable, List, Optional
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.storage import Store
+from meross_iot.controller.device import BaseDevice, GenericSubDevice, HubDevice
+from meross_iot.device_factory import build_meross_device_from_abilities, build_meross_subdevice
+from meross_iot.manager import MerossManager
+from meross_iot.model.enums import Namespace, OnlineStatus
+from meross_iot.model.exception import CommandTimeoutError
+from meross_iot.model.http.device import HttpDeviceInfo
+from meross_iot.model.http.subdevice import HttpSubdeviceInfo
+
+from .common import DOMAIN, ERRORS, log_exception
+
+_LOGGER = logging.getLogger(__name__)
+
+STORAGE_VERSION = 1
+STORAGE_KEY = f"{DOMAIN}.device_snapshots"
+SNAPSHOT_SAVE_DELAY = 30
+
+
+class DeviceSnapshotStore:
+    """
+    Keeps, for every discovered device, the abilities, channels, firmware/hardware versions, hub subdevices
+    and the last known Appliance.System.All state into HA storage.
+    On the next boot, devices whose snapshot is still consistent with the HTTP device list are rebuilt
+    right away, and their abilities are queried again in background to catch the changes the HTTP device list
+    does not reveal.
+    """
+
+    def __init__(self, hass: HomeAssistant, entry_id: str):
+        self._store = Store(hass, STORAGE_VERSION, f"{STORAGE_KEY}.{entry_id}")
+        self._errors = hass.data[DOMAIN][ERRORS]
+        self._snapshots: Dict[str, dict] = {}
+        self._devices: Dict[str, BaseDevice] = {}
+        self._states: Dict[str, dict] = {}
+
+    async def async_load(self) -> None:
+        data = await self._store.async_load()
+        self._snapshots = data.get("devices", {}) if data is not None else {}
+
+    async def async_restore_devices(self,
+                                    manager: MerossManager,
+                                    http_devices: Iterable[HttpDeviceInfo]) -> List[BaseDevice]:
+        """
+        Rebuilds and enrolls into the manager the devices having a valid snapshot.
+        Snapshots of devices no more listed by the HTTP API are dropped.
+        """
+        http_devices = {d.uuid: d for d in http_devices}
+        self._snapshots = {uuid: s for uuid, s in self._snapshots.items() if uuid in http_devices}
+
+        restored = []
+        for uuid, snapshot in self._snapshots.items():
+            http_device = http_devices[uuid]
+            if not _snapshot_matches(snapshot, http_device):
+                _LOGGER.debug("Snapshot of device %s (%s) is outdated and will be ignored", http_device.dev_name, uuid)
+                continue
+            try:
+                restored.extend(await self._async_restore_device(manager, http_device, snapshot))
+            except Exception:
+                log_exception(f"Failed to restore device {http_device.dev_name} ({uuid}) from snapshot",
+                              logger=_LOGGER, recorder=self._errors)
+        return restored
+
+    @staticmethod
+    async def _async_restore_device(manager: MerossManager,
+                                    http_device: HttpDeviceInfo,
+                                    snapshot: dict) -> List[BaseDevice]:
+        device = build_meross_device_from_abilities(http_device_info=http_device,
+                                                    device_abilities=snapshot["abilities"],
+                                                    manager=manager)
+        # The manager does not expose any public way of enrolling pre-built devices, so we need to
+        # access its registry directly.
+        manager._device_registry.enroll_device(device)
+        enrolled = manager._device_registry.lookup_base_by_uuid(device.uuid)
+        if enrolled is not device:
+            # The manager discovered the device on its own in the meantime: its instance is the one getting the pushes
+            _LOGGER.debug("Device %s (%s) was already enrolled, skipping its snapshot", device.name, device.uuid)
+            return [enrolled]
+        restored = [device]
+
+        if isinstance(device, HubDevice):
+            for subdevice_info in snapshot.get("subdevices", []):
+                subdevice = build_meross_subdevice(http_subdevice_info=HttpSubdeviceInfo.from_dict(subdevice_info),
+                                                   hub_uuid=device.uuid,
+                                                   hub_reported_abilities=device.abilities,
+                                                   manager=manager)
+                device.register_subdevice(subdevice=subdevice)
+                manager._device_registry.enroll_device(subdevice)
+                restored.append(subdevice)
+
+        # Replay the last known state, then re-apply the fresh HTTP info, as the online status reported
+        # by the stored state is likely outdated.
+        state = snapshot.get("state")
+        if state is not None:
+            await device.async_handle_update(namespace=Namespace.SYSTEM_ALL, data=state)
+            await device.update_from_http_state(http_device)
+        return restored
+
+    async def async_revalidate_devices(self, devices: Iterable[BaseDevice]) -> List[BaseDevice]:
+        """
+        Queries again the abilities of the given restored devices and drops the snapshot of the ones whose
+        abilities changed (e.g. after a firmware update), so that they get fully discovered on the next setup.
+        Returns the devices whose snapshot was dropped.
+        """
+        async def _async_changed(device: BaseDevice) -> bool:
+            if isinstance(device, GenericSubDevice) or device.online_status != OnlineStatus.ONLINE:
+                return False
+            try:
+                response = await device._execute_command(method="GET", namespace=Namespace.SYSTEM_ABILITY,
+                                                         payload={})
+            except CommandTimeoutError:
+                _LOGGER.debug("Could not revalidate the abilities of device %s (%s)", device.name, device.uuid)
+                return False
+            return response.get("ability") != device.abilities
+
+        devices = list(devices)
+        results = await asyncio.gather(*(_async_changed(d) for d in devices))
+        outdated = [d for d, changed in zip(devices, results) if changed]
+        for device in outdated:
+            _LOGGER.info("Abilities of device %s (%s) changed, dropping its snapshot", device.name, device.uuid)
+            self._snapshots.pop(device.uuid, None)
+            if self._devices.pop(device.uuid, None) is not None:
+                device.unregister_push_notification_handler_coroutine(self._async_push_notification_received)
+        if len(outdated) > 0:
+            await self._store.async_save(self._data_to_save())
+        return outdated
+
+    @callback
+    def async_track_devices(self, devices: Iterable[BaseDevice]) -> None:
+        """Starts keeping the snapshot of the given devices up to date"""
+        for device in devices:
+            if device is None or isinstance(device, GenericSubDevice):
+                # Subdevices are stored along with their hub
+                continue
+            if device.uuid not in self._devices:
+                device.register_push_notification_handler_coroutine(self._async_push_notification_received)
+            self._devices[device.uuid] = device
+        self._store.async_delay_save(self._data_to_save, SNAPSHOT_SAVE_DELAY)
+
+    async def _async_push_notification_received(self, namespace: Namespace, data: dict, device_internal_id: str):
+        if namespace != Namespace.SYSTEM_ALL:
+            return
+        for uuid, device in self._devices.items():
+            if device.internal_id == device_internal_id:
+                self._states[uuid] = data
+                self._store.async_delay_save(self._data_to_save, SNAPSHOT_SAVE_DELAY)
+                break
+
+    @callback
+    def _data_to_save(self) -> dict:
+        devices = dict(self._snapshots)
+        for uuid, device in self._devices.items():
+            snapshot = _build_snapshot(device, state=self._states.get(uuid, devices.get(uuid, {}).get("state")))
+            if snapshot is not None:
+                devices[uuid] = snapshot
+        self._snapshots = devices
+        return {"devices": devices}
+
+
+def _snapshot_matches(snapshot: dict, http_device: HttpDeviceInfo) -> bool:
+    """Tells whether the stored snapshot still describes the device reported by the HTTP API"""
+    return snapshot.get("device_type") == http_device.device_type and \
+        snapshot.get("hardware_version") == http_device.hdware_version and \
+        snapshot.get("firmware_version") == http_device.fmware_version and \
+        snapshot.get("channels") == http_device.channels
+
+
+def _build_snapshot(device: BaseDevice, state: Optional[dict]) -> Optional[dict]:
+    http_info = device.cached_http_info
+    if http_info is None or not device.abilities:
+        # Devices built statically (without abilities) cannot be rebuilt from a snapshot
+        return None
+
+    snapshot = {
+        "device_type": http_info.device_type,
+        "hardware_version": http_info.hdware_version,
+        "firmware_version": http_info.fmware_version,
+        "channels": http_info.channels,
+        "abilities": device.abilities,
+        "state": state
+    }
+    if isinstance(device, HubDevice):
+        snapshot["subdevices"] = [{
+            "subDeviceId": s.subdevice_id,
+            "trueId": None,
+            "subDeviceType": s.type,
+            "subDeviceVendor": None,
+            "subDeviceName": s.name,
+            "subDeviceIconId": None
+        } for s in device.get_subdevices()]
+    return snapshot
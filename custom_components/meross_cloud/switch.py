@@ -1,6 +1,6 @@
 import logging
-from datetime import datetime
-from typing import Optional, Dict
+from datetime import date
+from typing import Optional, Dict, List
 
 from homeassistant.core import HomeAssistant
 from meross_iot.controller.device import BaseDevice
@@ -12,15 +12,19 @@ from meross_iot.controller.mixins.dnd import SystemDndMixin
 from meross_iot.controller.mixins.toggle import ToggleXMixin, ToggleMixin
 from meross_iot.manager import MerossManager
 from meross_iot.model.http.device import HttpDeviceInfo
-from meross_iot.model.enums import DNDMode
+from meross_iot.model.enums import DNDMode, Namespace
 
 # Conditional import for switch device
 from homeassistant.components.switch import SwitchEntity
 from homeassistant.helpers.update_coordinator import DataUpdateCoordinator
 from . import MerossDevice
+from .coordinator import (ElectricitySampler, ConsumptionCache, DndModeCoordinator, get_electricity_sampler,
+                          get_consumption_cache, get_consumption_update_interval, get_dnd_mode_coordinator)
 from .common import (DOMAIN, MANAGER, DEVICE_LIST_COORDINATOR, HA_SWITCH)
+from .metrics import measured
 
 _LOGGER = logging.getLogger(__name__)
+PARALLEL_UPDATES = 0
 
 
 class MerossSwitchDevice(ToggleXMixin, BaseDevice):
@@ -40,31 +44,30 @@ class MerossDndDevice(SystemDndMixin, BaseDevice):
 class SwitchEntityWrapper(MerossDevice, SwitchEntity):
     """Wrapper class to adapt the Meross switches into the Homeassistant platform"""
     _device: MerossSwitchDevice
+    _push_namespaces = (Namespace.CONTROL_TOGGLEX, Namespace.CONTROL_TOGGLE)
 
     def __init__(self,
                  channel: int,
                  device: MerossSwitchDevice,
-                 device_list_coordinator: DataUpdateCoordinator[Dict[str, HttpDeviceInfo]]):
+                 device_list_coordinator: DataUpdateCoordinator[Dict[str, HttpDeviceInfo]],
+                 sampler: Optional[ElectricitySampler] = None,
+                 consumption_cache: Optional[ConsumptionCache] = None):
         super().__init__(
             device=device,
             channel=channel,
             device_list_coordinator=device_list_coordinator,
             platform=HA_SWITCH)
 
-        # Device properties
-        self._last_power_sample = None
-        self._daily_consumption = None
-
-    async def async_update(self):
-        if self.online:
-            await super().async_update()
-
-            # If the device supports power reading, update it
-            if isinstance(self._device, ElectricityMixin):
-                self._last_power_sample = await self._device.async_get_instant_metrics(channel=self._channel_id)
+        # Power readings and consumption history are collected by the coordinators shared with the power sensors
+        self._sampler = sampler
+        self._consumption_cache = consumption_cache
 
-            if isinstance(self._device, ConsumptionXMixin):
-                self._daily_consumption = await self._device.async_get_daily_power_consumption(channel=self._channel_id)
+    async def async_added_to_hass(self) -> None:
+        await super().async_added_to_hass()
+        # Power and energy attributes are refreshed by the shared coordinators: write them as soon as they change
+        for coordinator in (self._sampler, self._consumption_cache):
+            if coordinator is not None:
+                self.async_on_remove(coordinator.async_add_listener(self.async_write_ha_state))
 
     @property
     def is_on(self) -> bool:
@@ -81,31 +84,28 @@ class SwitchEntityWrapper(MerossDevice, SwitchEntity):
 
     @property
     def current_power_w(self) -> Optional[float]:
-        if self._last_power_sample is not None:
-            return self._last_power_sample.power
+        if self._sampler is None:
+            return None
+        sample = self._sampler.get_sample(channel=self._channel_id)
+        if sample is not None:
+            return sample.power
 
     @property
     def today_energy_kwh(self) -> Optional[float]:
-        if self._daily_consumption is not None:
-            today = datetime.today()
-            total = 0
-            daystart = datetime(year=today.year, month=today.month, day=today.day, hour=0, second=0)
-            for x in self._daily_consumption:
-              if x['date'] == daystart:
-                total = x['total_consumption_kwh']
-            return total
+        if self._consumption_cache is not None and self._consumption_cache.data is not None:
+            total = self._consumption_cache.get_daily_consumption(channel=self._channel_id, day=date.today())
+            return total if total is not None else 0
 
 
 class DndEntityWrapper(MerossDevice, SwitchEntity):
-    """Wrapper class to adapt the Meross switches into the Homeassistant platform"""
+    """Wrapper class to adapt the Meross do-not-disturb setting into the Homeassistant platform"""
     _device: MerossDndDevice
-
-    # The DNDMode change does not trigger any push notification, so we cannot we
-    _attr_should_poll = True
-    _dnd_mode: Optional[DNDMode] = None
+    # The DND mode is not part of the device state pushes: it is read by the coordinator shared with its siblings
+    _push_namespaces = ()
 
     def __init__(self,
                  device: MerossDndDevice,
+                 dnd_mode_coordinator: DndModeCoordinator,
                  device_list_coordinator: DataUpdateCoordinator[Dict[str, HttpDeviceInfo]]):
         super().__init__(
             device=device,
@@ -113,35 +113,40 @@ class DndEntityWrapper(MerossDevice, SwitchEntity):
             device_list_coordinator=device_list_coordinator,
             platform=HA_SWITCH,
             override_channel_name="Do Not Disturb")
+        self._dnd_mode_coordinator = dnd_mode_coordinator
+
+    async def async_added_to_hass(self) -> None:
+        await super().async_added_to_hass()
+        self.async_on_remove(self._dnd_mode_coordinator.async_add_listener(self.async_write_ha_state))
 
+    @measured("update")
     async def async_update(self):
         if self.online:
-            await super().async_update()
-            self._dnd_mode = await self._device.async_get_dnd_mode()
+            # Requests issued when the device comes back online are debounced by the coordinator
+            await self._dnd_mode_coordinator.async_request_refresh()
 
     @property
     def is_on(self) -> bool | None:
-        if self._dnd_mode is None:
+        if self._dnd_mode_coordinator.data is None:
             return None
-        return self._dnd_mode == DNDMode.DND_DISABLED
+        return self._dnd_mode_coordinator.data == DNDMode.DND_DISABLED
 
     async def async_turn_off(self, **kwargs) -> None:
         dev = self._device
         await dev.set_dnd_mode(mode=DNDMode.DND_ENABLED, skip_rate_limits=True)
-        self._dnd_mode = DNDMode.DND_ENABLED
+        self._dnd_mode_coordinator.async_set_updated_data(DNDMode.DND_ENABLED)
 
     async def async_turn_on(self, **kwargs) -> None:
         dev = self._device
         await dev.set_dnd_mode(mode=DNDMode.DND_DISABLED, skip_rate_limits=True)
-        self._dnd_mode = DNDMode.DND_DISABLED
+        self._dnd_mode_coordinator.async_set_updated_data(DNDMode.DND_DISABLED)
 
 
 async def async_setup_entry(hass: HomeAssistant, config_entry, async_add_entities):
-    def entity_adder_callback():
-        """Discover and adds new Meross entities"""
-        manager: MerossManager = hass.data[DOMAIN][MANAGER]  # type
+    def entity_adder_callback(devices: List[BaseDevice], removed: List[BaseDevice]):
+        """Adds the Meross entities of the newly discovered devices"""
         coordinator = hass.data[DOMAIN][DEVICE_LIST_COORDINATOR]
-        devices = manager.find_devices()
+        consumption_update_interval = get_consumption_update_interval(config_entry)
 
         new_entities = []
 
@@ -152,25 +157,30 @@ async def async_setup_entry(hass: HomeAssistant, config_entry, async_add_entitie
         devs = filter(lambda d: not (isinstance(d, GarageOpenerMixin) or isinstance(d, LightMixin)), devs)
 
         for d in devs:
+            sampler = get_electricity_sampler(hass, d) if isinstance(d, ElectricityMixin) else None
+            consumption_cache = get_consumption_cache(hass, d, update_interval=consumption_update_interval) \
+                if isinstance(d, ConsumptionXMixin) else None
             channels = [c.index for c in d.channels] if len(d.channels) > 0 else [0]
             for channel_index in channels:
                 w = SwitchEntityWrapper(device=d, channel=channel_index,
-                                        device_list_coordinator=coordinator)
+                                        device_list_coordinator=coordinator, sampler=sampler,
+                                        consumption_cache=consumption_cache)
                 if w.unique_id not in hass.data[DOMAIN]["ADDED_ENTITIES_IDS"]:
                     new_entities.append(w)
 
         dnd_switches = filter(lambda d: isinstance(d, SystemDndMixin), devices)
         for d in dnd_switches:
-            w = DndEntityWrapper(device=d, device_list_coordinator=coordinator)
+            w = DndEntityWrapper(device=d, dnd_mode_coordinator=get_dnd_mode_coordinator(hass, d),
+                                 device_list_coordinator=coordinator)
             if w.unique_id not in hass.data[DOMAIN]["ADDED_ENTITIES_IDS"]:
                 new_entities.append(w)
 
         async_add_entities(new_entities, True)
 
+    # The coordinator immediately reports the devices it already knows and then only notifies the ones that
+    # get added or removed afterwards.
     coordinator = hass.data[DOMAIN][DEVICE_LIST_COORDINATOR]
-    coordinator.async_add_listener(entity_adder_callback)
-    # Run the entity adder a first time during setup
-    entity_adder_callback()
+    config_entry.async_on_unload(coordinator.async_add_device_set_listener(entity_adder_callback))
 
 # TODO: Implement entry unload
 # TODO: Unload entry
@@ -0,0 +1,16 @@
+import importlib.util
+from pathlib import Path
+from types import ModuleType
+
+INTEGRATION_DIR = Path(__file__).parents[1] / "custom_components" / "meross_cloud"
+
+
+def load_integration_module(name: str) -> ModuleType:
+    """
+    Loads a module of the integration that only depends on the standard library, bypassing the package __init__,
+    which needs Home Assistant: its tests then run wherever pytest does.
+    """
+    spec = importlib.util.spec_from_file_location(f"meross_cloud_{name}", INTEGRATION_DIR / f"{name}.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
@@ -0,0 +1,66 @@
+"""Tests of the coalescing of the commands sent to a device channel"""
+import asyncio
+import gc
+
+from tests import load_integration_module
+
+CommandCoalescer = load_integration_module("coalescer").CommandCoalescer
+
+
+async def _settle() -> None:
+    """Lets the pending tasks run until they block"""
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_changes_submitted_while_a_command_is_in_flight_are_merged_into_one_send():
+    async def _run():
+        in_flight = asyncio.Event()
+        sent = []
+
+        async def _send(state):
+            sent.append(state)
+            if len(sent) == 1:
+                await in_flight.wait()
+
+        coalescer = CommandCoalescer("light", _send)
+        first = asyncio.create_task(coalescer.async_submit(onoff=1, luminance=10))
+        await _settle()
+        # The first command is in flight: the following changes wait for it and are sent together
+        merged = [asyncio.create_task(coalescer.async_submit(luminance=20)),
+                  asyncio.create_task(coalescer.async_submit(luminance=30, temperature=50)),
+                  asyncio.create_task(coalescer.async_submit(rgb=0xFF0000, temperature=None))]
+        await _settle()
+        in_flight.set()
+        await asyncio.gather(first, *merged)
+        return sent
+
+    sent = asyncio.run(_run())
+
+    assert sent == [{"onoff": 1, "luminance": 10}, {"luminance": 30, "rgb": 0xFF0000}]
+
+
+def test_failure_of_a_command_every_caller_gave_up_on_is_retrieved():
+    unretrieved = []
+
+    async def _run():
+        asyncio.get_running_loop().set_exception_handler(lambda loop, context: unretrieved.append(context))
+        fail = asyncio.Event()
+
+        async def _send(state):
+            await fail.wait()
+            raise RuntimeError("device unreachable")
+
+        coalescer = CommandCoalescer("light", _send)
+        caller = asyncio.create_task(coalescer.async_submit(onoff=1))
+        await _settle()
+        caller.cancel()
+        await _settle()
+        fail.set()
+        await _settle()
+        del coalescer, caller
+        gc.collect()
+
+    asyncio.run(_run())
+
+    assert unretrieved == []
@@ -0,0 +1,208 @@
+"""Tests of the primitives bounding, ordering and pacing the commands"""
+import asyncio
+import time
+
+import pytest
+
+from tests import load_integration_module
+
+concurrency = load_integration_module("concurrency")
+CommandPriority = concurrency.CommandPriority
+DeviceCommandScheduler = concurrency.DeviceCommandScheduler
+PrioritySlots = concurrency.PrioritySlots
+RateLimiter = concurrency.RateLimiter
+
+
+async def _settle() -> None:
+    """Lets the pending tasks run until they block"""
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_slots_are_handed_over_by_priority_then_arrival():
+    async def _run():
+        slots = PrioritySlots(1)
+        order = []
+
+        async def _hold(tag, priority):
+            await slots.async_acquire(priority)
+            order.append(tag)
+            slots.release()
+
+        await slots.async_acquire(CommandPriority.USER)
+        tasks = [asyncio.create_task(_hold("poll-1", CommandPriority.POLL)),
+                 asyncio.create_task(_hold("poll-2", CommandPriority.POLL)),
+                 asyncio.create_task(_hold("user", CommandPriority.USER))]
+        await _settle()
+        slots.release()
+        await asyncio.gather(*tasks)
+        return order, slots._in_flight
+
+    order, in_flight = asyncio.run(_run())
+
+    assert order == ["user", "poll-1", "poll-2"]
+    assert in_flight == 0
+
+
+def test_slot_handed_to_a_cancelled_waiter_goes_to_the_next_one():
+    async def _run():
+        slots = PrioritySlots(1)
+        await slots.async_acquire(CommandPriority.USER)
+        first = asyncio.create_task(slots.async_acquire(CommandPriority.USER))
+        second = asyncio.create_task(slots.async_acquire(CommandPriority.USER))
+        await _settle()
+        # The slot is handed to the first waiter, which is cancelled before it gets to run
+        slots.release()
+        first.cancel()
+        await _settle()
+        return first, second, slots._in_flight
+
+    first, second, in_flight = asyncio.run(_run())
+
+    assert first.cancelled()
+    assert second.done() and second.result() is True
+    assert in_flight == 1
+
+
+def test_lowered_bound_holds_the_waiters_until_in_flight_drops_below_it():
+    async def _run():
+        slots = PrioritySlots(2)
+        await slots.async_acquire(CommandPriority.USER)
+        await slots.async_acquire(CommandPriority.USER)
+        waiter = asyncio.create_task(slots.async_acquire(CommandPriority.USER))
+        await _settle()
+        slots.max_in_flight = 1
+
+        slots.release()
+        await _settle()
+        woken_early = waiter.done()
+        in_flight_after_first_release = slots._in_flight
+
+        slots.release()
+        await _settle()
+        return woken_early, in_flight_after_first_release, waiter.done(), slots._in_flight
+
+    woken_early, in_flight_after_first_release, woken, in_flight = asyncio.run(_run())
+
+    assert not woken_early
+    assert in_flight_after_first_release == 1
+    assert woken
+    assert in_flight == 1
+
+
+def test_raised_bound_lets_the_waiters_in():
+    async def _run():
+        slots = PrioritySlots(1)
+        await slots.async_acquire(CommandPriority.USER)
+        waiter = asyncio.create_task(slots.async_acquire(CommandPriority.POLL))
+        await _settle()
+        slots.max_in_flight = 2
+        await _settle()
+        return waiter.done(), slots._in_flight
+
+    woken, in_flight = asyncio.run(_run())
+
+    assert woken
+    assert in_flight == 2
+
+
+def test_user_command_overtakes_queued_polls():
+    async def _run():
+        scheduler = DeviceCommandScheduler(name="device", global_slots=PrioritySlots(10))
+        release_first = asyncio.Event()
+        sent = []
+
+        def _command(tag, wait=None):
+            async def _send():
+                sent.append(tag)
+                if wait is not None:
+                    await wait.wait()
+                return tag
+            return _send
+
+        busy = asyncio.create_task(scheduler.async_execute(_command("busy", release_first), CommandPriority.POLL))
+        await _settle()
+        queued = [asyncio.create_task(scheduler.async_execute(_command("poll-1"), CommandPriority.POLL)),
+                  asyncio.create_task(scheduler.async_execute(_command("poll-2"), CommandPriority.POLL)),
+                  asyncio.create_task(scheduler.async_execute(_command("user"), CommandPriority.USER))]
+        await _settle()
+        release_first.set()
+        results = await asyncio.gather(busy, *queued)
+        return sent, results
+
+    sent, results = asyncio.run(_run())
+
+    assert sent == ["busy", "user", "poll-1", "poll-2"]
+    assert results == ["busy", "poll-1", "poll-2", "user"]
+
+
+def test_command_cancelled_waiting_for_a_global_slot_frees_its_device_slot():
+    async def _run():
+        global_slots = PrioritySlots(1)
+        scheduler = DeviceCommandScheduler(name="device", global_slots=global_slots)
+
+        async def _send():
+            return "sent"
+
+        # Another device holds the only global slot
+        await global_slots.async_acquire(CommandPriority.USER)
+        waiting = asyncio.create_task(scheduler.async_execute(_send, CommandPriority.POLL))
+        await _settle()
+        waiting.cancel()
+        await _settle()
+        global_slots.release()
+        return waiting, await scheduler.async_execute(_send, CommandPriority.USER), global_slots._in_flight
+
+    waiting, result, global_in_flight = asyncio.run(_run())
+
+    assert waiting.cancelled()
+    assert result == "sent"
+    assert global_in_flight == 0
+
+
+def test_rate_limiter_spaces_the_callers_evenly():
+    async def _run():
+        limiter = RateLimiter(20)
+        start = time.monotonic()
+        waited = [await limiter.async_acquire() for _ in range(3)]
+        return waited, time.monotonic() - start
+
+    waited, elapsed = asyncio.run(_run())
+
+    assert waited == [False, True, True]
+    assert elapsed == pytest.approx(0.1, abs=0.04)
+
+
+def test_rate_limiter_gives_back_the_slot_of_a_cancelled_caller():
+    async def _run():
+        limiter = RateLimiter(10)
+        await limiter.async_acquire()
+        cancelled = asyncio.create_task(limiter.async_acquire())
+        await _settle()
+        cancelled.cancel()
+        await _settle()
+        # The next caller takes the slot the cancelled one gave back, rather than queueing behind it
+        start = time.monotonic()
+        await limiter.async_acquire()
+        return time.monotonic() - start
+
+    assert asyncio.run(_run()) < 0.15
+
+
+def test_rate_limiter_keeps_the_slot_of_a_cancelled_caller_with_later_callers_queued():
+    async def _run():
+        limiter = RateLimiter(10)
+        await limiter.async_acquire()
+        cancelled = asyncio.create_task(limiter.async_acquire())
+        queued = asyncio.create_task(limiter.async_acquire())
+        await _settle()
+        next_slot = limiter._next_slot
+        cancelled.cancel()
+        await _settle()
+        queued.cancel()
+        return next_slot, limiter._next_slot
+
+    next_slot_before, next_slot_after = asyncio.run(_run())
+
+    # Giving the slot back would let the next caller in ahead of the queued one
+    assert next_slot_after == next_slot_before
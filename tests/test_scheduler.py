@@ -0,0 +1,83 @@
+"""Tests of the command scheduling performed by the manager"""
+import asyncio
+
+import pytest
+
+pytest.importorskip("homeassistant")
+pytest.importorskip("meross_iot")
+
+from meross_iot.model.enums import Namespace  # noqa: E402
+
+from custom_components.meross_cloud.common import CIRCUIT_BREAKER_THRESHOLD  # noqa: E402
+from custom_components.meross_cloud.health import DeviceBackoffError  # noqa: E402
+from custom_components.meross_cloud.concurrency import polling_priority  # noqa: E402
+from custom_components.meross_cloud.scheduler import CommandSchedulerMixin  # noqa: E402
+
+DEVICE_UUID = "0123456789abcdef"
+
+
+class _FakeRegistry:
+    def lookup_base_by_uuid(self, uuid):
+        return None
+
+
+class _FakeManager:
+    """Stands for the meross_iot manager: records the commands instead of sending them"""
+
+    def __init__(self):
+        self._device_registry = _FakeRegistry()
+        self.sent = []
+
+    async def async_execute_cmd(self, mqtt_hostname, mqtt_port, destination_device_uuid, method, namespace, payload,
+                                timeout=None, **kwargs):
+        self.sent.append((method, namespace, timeout))
+        return {"all": {}}
+
+
+class _SchedulingFakeManager(CommandSchedulerMixin, _FakeManager):
+    pass
+
+
+async def _get(manager, poll: bool = False):
+    async def _execute():
+        return await manager.async_execute_cmd(mqtt_hostname="localhost", mqtt_port=2001,
+                                               destination_device_uuid=DEVICE_UUID, method="GET",
+                                               namespace=Namespace.SYSTEM_ALL, payload={}, timeout=10)
+
+    if poll:
+        with polling_priority():
+            return await _execute()
+    return await _execute()
+
+
+def _open_circuit(manager) -> None:
+    health = manager._device_health(DEVICE_UUID)
+    for _ in range(CIRCUIT_BREAKER_THRESHOLD):
+        health.record_failure()
+    assert health.is_open()
+
+
+def test_user_query_does_not_join_pending_poll_against_open_circuit():
+    async def _run():
+        manager = _SchedulingFakeManager()
+        _open_circuit(manager)
+        # The poll is still pending when the identical user query comes in
+        return manager, await asyncio.gather(_get(manager, poll=True), _get(manager), return_exceptions=True)
+
+    manager, (poll_result, user_result) = asyncio.run(_run())
+
+    assert isinstance(poll_result, DeviceBackoffError)
+    assert user_result == {"all": {}}
+    # The user query went over the wire on its own, with the timeout it was issued with
+    assert manager.sent == [("GET", Namespace.SYSTEM_ALL, 10)]
+
+
+def test_poll_joins_pending_user_query():
+    async def _run():
+        manager = _SchedulingFakeManager()
+        return manager, await asyncio.gather(_get(manager), _get(manager, poll=True))
+
+    manager, results = asyncio.run(_run())
+
+    assert results == [{"all": {}}, {"all": {}}]
+    assert len(manager.sent) == 1